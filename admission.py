@@ -0,0 +1,182 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+# Har bir foydalanuvchi uchun: soniyasiga nechta Gemini so'rovi va ketma-ket ruxsat etilgan so'rovlar
+USER_RATE = float(os.getenv("USER_RATE", "0.2"))
+USER_BURST = float(os.getenv("USER_BURST", "3"))
+# Butun bot uchun umumiy chegara
+GLOBAL_RATE = float(os.getenv("GLOBAL_RATE", "10"))
+GLOBAL_BURST = float(os.getenv("GLOBAL_BURST", "20"))
+# Umumiy chegara to'lganda navbatda kutishi mumkin bo'lgan so'rovlar soni va kutish muddati (soniya)
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "50"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "5"))
+# Xotirada saqlanadigan foydalanuvchi chelaklari soni
+ADMISSION_USERS = int(os.getenv("ADMISSION_USERS", "10000"))
+# Ketma-ket shuncha xatodan keyin Gemini'ga so'rovlar BREAKER_RESET soniyaga to'xtatiladi
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+
+
+# Token chelagi: rate tezlikda to'ladi, capacity dan oshmaydi
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    # Ishlatilmay qolgan tokenni qaytarish (so'rov keyinroq rad etilsa yoki bekor qilinsa)
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    # Keyingi token paydo bo'lguncha qolgan vaqt (soniya)
+    def wait_time(self) -> float:
+        self._refill(time.monotonic())
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+# Gemini xatolarda bo'lsa, so'rovlarni vaqtincha to'xtatuvchi uzgich.
+# closed -> (BREAKER_FAILURES xato) -> open -> (BREAKER_RESET soniya) -> half_open -> bitta sinov so'rovi
+class CircuitBreaker:
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe = False
+        self._probe_at = 0.0
+        self.opened = 0
+
+    # So'rov hozir o'tkazilmasligi aniq bo'lsa True (holat o'zgarmaydi, sinov so'rovi olinmaydi)
+    def blocked(self) -> bool:
+        now = time.monotonic()
+        if self.state == "open":
+            return now - self._opened_at < self.reset_timeout
+        # Sinov so'rovi javobsiz qolsa (masalan, bekor qilinsa), reset_timeout dan keyin yangisi yuboriladi
+        return self.state == "half_open" and self._probe and now - self._probe_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        if self.blocked():
+            return False
+        if self.state == "open":
+            self.state = "half_open"
+        if self.state == "half_open":
+            self._probe = True
+            self._probe_at = time.monotonic()
+        return True
+
+    def record_success(self):
+        self._consecutive = 0
+        self._probe = False
+        self.state = "closed"
+
+    def record_failure(self):
+        self._consecutive += 1
+        self._probe = False
+        if self.state == "half_open" or self._consecutive >= self.failures:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+# Gemini so'rovlariga kirishni boshqarish: foydalanuvchi va umumiy token chelaklari,
+# chegaralangan kutish navbati va uzgich. Ruxsat berilmagan so'rovlar "tashlanadi" va
+# chaqiruvchi ularga tayyor javob qaytaradi
+class AdmissionController:
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._users = OrderedDict()
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = {"circuit_open": 0, "user_rate": 0, "queue_full": 0, "timeout": 0, "background": 0}
+
+    def _user_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = self._users[user_id] = TokenBucket(USER_RATE, USER_BURST)
+            while len(self._users) > ADMISSION_USERS:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return bucket
+
+    # Ruxsat so'rash: ruxsat berilsa None, aks holda tashlanish sababi qaytariladi.
+    # Uzgichning half_open sinovi eng oxirida, foydalanuvchi va umumiy chegaradan o'tgan so'rovga beriladi:
+    # aks holda sinov user_rate bilan tashlanadigan so'rovga tushib, tiklanish yana reset_timeout ga cho'ziladi.
+    # Keyinroq rad etilgan yoki kutish paytida bekor qilingan so'rovning tokenlari qaytariladi
+    async def acquire(self, user_id: int):
+        if self.breaker.blocked():
+            return self._reject("circuit_open")
+        bucket = self._user_bucket(user_id)
+        if not bucket.take():
+            return self._reject("user_rate")
+        try:
+            reason = await self._acquire_global()
+        except BaseException:
+            bucket.refund()
+            raise
+        if reason is None and not self.breaker.allow():
+            self._global.refund()
+            reason = "circuit_open"
+        if reason is not None:
+            bucket.refund()
+            return self._reject(reason)
+        self.admitted += 1
+        return None
+
+    # Umumiy chelakdan token olish, kerak bo'lsa chegaralangan navbatda kutib
+    async def _acquire_global(self):
+        if self._global.take():
+            return None
+        if self.waiting >= ADMISSION_QUEUE_SIZE:
+            return "queue_full"
+        deadline = time.monotonic() + ADMISSION_MAX_WAIT
+        self.waiting += 1
+        try:
+            while not self._global.take():
+                delay = self._global.wait_time()
+                if time.monotonic() + delay > deadline:
+                    return "timeout"
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+        return None
+
+    # Fon so'rovlari (suhbat xulosasi) uchun ruxsat: kutmaydi, foydalanuvchi chelagiga tegmaydi va
+    # uzgich to'liq yopiq bo'lmasa (half_open sinovi ham foydalanuvchi so'roviga qoladi) berilmaydi
+    def acquire_background(self):
+        if self.breaker.state != "closed" or not self.breaker.allow() or not self._global.take():
+            return self._reject("background")
+        self.admitted += 1
+        return None
+
+    def _reject(self, reason: str) -> str:
+        self.shed[reason] += 1
+        return reason
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "queue_depth": self.waiting,
+            "shed": dict(self.shed),
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+        }
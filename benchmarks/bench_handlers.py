@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Handlerlarni (handle_message, /start, /joke, /history) Telegram va Gemini'siz yuklama ostida o'lchash.
+# airo_dataset.json va sun'iy ko'p tilli trafik soxta Update/Context obyektlari orqali haqiqiy
+# handlerlarga beriladi, Gemini o'rniga kechikish va xato taqsimoti sozlanadigan soxta model ishlatiladi.
+# Natija JSON ko'rinishida chiqariladi (commitlar orasida solishtirish uchun).
+# Ishga tushirish: python benchmarks/bench_handlers.py --concurrency 32 --synthetic 2000 --output bench.json
+# Bot sozlamalari (COALESCE_WINDOW, USER_RATE, RESPONSE_CACHE_LENGTHS, ...) odatdagidek muhitdan olinadi.
+
+# Sun'iy trafik uchun xabar bo'laklari: (til, matnlar)
+SYNTHETIC_MESSAGES = {
+    "uz": (
+        "salom", "nima gap?", "qalesan?", "bugun kayfiyatim yomon", "hazil ayt", "men xafaman",
+        "ertaga imtihonim bor, qanday tayyorlansam bo'ladi", "toshkentda qayerga borish mumkin",
+        "menga ovqat retseptini aytib ber, palov qanday pishiriladi va nima kerak bo'ladi",
+        "dasturlashni o'rganmoqchiman, qaysi tildan boshlasam yaxshi, maslahat ber iltimos do'stim",
+    ),
+    "ru": (
+        "привет", "как дела?", "что нового?", "мне грустно сегодня", "расскажи шутку",
+        "посоветуй фильм на вечер", "как выучить английский быстро и без скуки, есть идеи",
+        "что посмотреть в самарканде за два дня, куда сходить и что попробовать из еды",
+    ),
+    "en": (
+        "hello", "what's up?", "how are you?", "tell me a joke lol", "i feel sad today",
+        "recommend a book for the weekend", "how do i stay focused while working from home all day",
+        "explain how neural networks learn in simple words, with an example if you can please",
+    ),
+}
+COMMANDS = ("/start", "/joke", "/history")
+
+
+# Gemini o'rnidagi soxta model: kechikish log-normal taqsimotda, xatolar berilgan ehtimollik bilan
+class StubModel:
+    def __init__(self, rng, responses, latency_ms, sigma, failure_rate, timeout_rate, chunks):
+        self.rng = rng
+        self.responses = responses
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.chunks = chunks
+        self.calls = 0
+        self.failures = 0
+
+    def _latency(self) -> float:
+        if self.rng.random() < self.timeout_rate:
+            return 3600.0
+        return self.rng.lognormvariate(0, self.sigma) * self.latency_ms / 1000
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        latency = self._latency()
+        text = self.rng.choice(self.responses)
+        fail = self.rng.random() < self.failure_rate
+        if not stream:
+            await asyncio.sleep(latency)
+            if fail:
+                self.failures += 1
+                raise RuntimeError("stub: 503 Service Unavailable")
+            return SimpleNamespace(text=text)
+        return self._stream(text, latency, fail)
+
+    async def _stream(self, text, latency, fail):
+        step = max(1, len(text) // self.chunks)
+        for start in range(0, len(text), step):
+            await asyncio.sleep(latency / self.chunks)
+            if fail and start:
+                self.failures += 1
+                raise RuntimeError("stub: stream interrupted")
+            yield SimpleNamespace(text=text[start:start + step])
+
+
+# Soxta Telegram xabari: javoblar faqat sanaladi, ixtiyoriy tarmoq kechikishi bilan
+class FakeMessage:
+    def __init__(self, bench, user_id, text):
+        self.bench = bench
+        self.text = text
+        self.from_user = SimpleNamespace(id=user_id, first_name="Bench", is_bot=False)
+        self.chat = SimpleNamespace(id=user_id, type="private")
+
+    async def reply_text(self, text, **kwargs):
+        await self.bench.telegram_call()
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        await self.bench.telegram_call()
+        return self
+
+
+def fake_update(bench, user_id, text):
+    message = FakeMessage(bench, user_id, text)
+    return SimpleNamespace(message=message, effective_user=message.from_user, effective_message=message, callback_query=None)
+
+
+# Nearest-rank: q foizdan kam bo'lmagan qiymatlarni qamrab oladigan eng kichik element
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, math.ceil(q * len(values) / 100) - 1))
+    return round(values[index] * 1000, 2)
+
+
+def summarize(latencies: list) -> dict:
+    return {
+        "count": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+# Foydalanuvchilar bo'yicha xabarlar ketma-ketligi: datasetdan va sun'iy trafikdan
+def build_traffic(args, rng) -> tuple:
+    conversations = {}
+    responses = []
+    if args.dataset:
+        # export -> storage DB_PATH ni import vaqtida o'qiydi, shuning uchun bu yerda yuklanadi
+        from export import iter_dataset
+
+        for row in iter_dataset(args.dataset):
+            conversations.setdefault(row["user_id"], []).append(row["prompt"])
+            responses.append(row["response"])
+    for _ in range(args.synthetic):
+        user_id = 9_000_000 + rng.randrange(max(1, args.synthetic // 5))
+        language = rng.choice(tuple(SYNTHETIC_MESSAGES))
+        text = rng.choice(SYNTHETIC_MESSAGES[language])
+        if rng.random() < args.command_rate:
+            text = rng.choice(COMMANDS)
+        conversations.setdefault(user_id, []).append(text)
+    if not responses:
+        responses = ["Zo'r savol! Keling, birga o'ylab ko'ramiz.", "Great question, mate! Let's figure it out."]
+    return conversations, responses
+
+
+class Bench:
+    def __init__(self, args, tg):
+        self.args = args
+        self.tg = tg
+        self.latencies = {"handle_message": [], "start": [], "joke": [], "history": []}
+        # Partiyaning o'zini qayta ishlash vaqti (COALESCE_WINDOW kutishisiz)
+        self.respond_latencies = []
+        self.pending = {}
+        self.user_data = {}
+        self.db_tasks = 0
+        self.sql_statements = 0
+        self.errors = 0
+
+    async def telegram_call(self):
+        if self.args.telegram_ms:
+            await asyncio.sleep(self.args.telegram_ms / 1000)
+
+    def context(self, user_id):
+        return SimpleNamespace(user_data=self.user_data.setdefault(user_id, {}), args=[], bot=None)
+
+    # Coalescer partiyasi tugaganda, shu partiyadagi har bir xabar uchun kechikish yoziladi.
+    # handle_message kechikishi foydalanuvchi ko'radigan vaqt (COALESCE_WINDOW kutishi bilan),
+    # respond esa partiya boshlangandan javobgacha
+    async def timed_respond(self, user_id, items):
+        started = time.perf_counter()
+        try:
+            await self.tg.respond(user_id, items)
+        except Exception:
+            self.errors += 1
+        done = time.perf_counter()
+        self.respond_latencies.append(done - started)
+        for update, _ in items:
+            started, future = self.pending.pop(id(update))
+            self.latencies["handle_message"].append(done - started)
+            future.set_result(None)
+
+    async def send(self, user_id, text):
+        update = fake_update(self, user_id, text)
+        context = self.context(user_id)
+        started = time.perf_counter()
+        if text.startswith("/"):
+            name = text[1:].split("@")[0].split(" ")[0]
+            handler = {"start": self.tg.start, "joke": self.tg.joke, "history": self.tg.history}.get(name)
+            # Noma'lum buyruqlarga bot javob bermaydi
+            if handler is None:
+                return
+            await handler(update, context)
+            self.latencies[name].append(time.perf_counter() - started)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.pending[id(update)] = (started, future)
+        await self.tg.handle_message(update, context)
+        await future
+
+    # Bitta foydalanuvchi: xabarlarini ketma-ket yuboradi va har biriga javob kutadi
+    async def user_session(self, user_id, messages, semaphore):
+        async with semaphore:
+            for text in messages:
+                await self.send(user_id, text)
+                if self.args.think_ms:
+                    await asyncio.sleep(self.args.think_ms / 1000)
+
+    async def run(self, conversations):
+        tg = self.tg
+        tg.coalescer.process = self.timed_respond
+        run_db = tg.storage._run
+
+        async def counted_run(func, *args):
+            self.db_tasks += 1
+            return await run_db(func, *args)
+
+        tg.storage._run = counted_run
+        tg.storage._run_sync(lambda: tg.storage._connection().set_trace_callback(self._count_statement))
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.user_session(user_id, messages, semaphore) for user_id, messages in conversations.items()
+        ))
+        await tg.storage.flush()
+        return time.perf_counter() - started
+
+    def _count_statement(self, statement):
+        self.sql_statements += 1
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handlerlarni soxta Telegram va Gemini bilan yuklama ostida o'lchash")
+    parser.add_argument("--dataset", default=os.path.join(ROOT, "airo_dataset.json"), help="qayta o'ynaladigan dataset ('' - o'chirish)")
+    parser.add_argument("--synthetic", type=int, default=1000, help="sun'iy xabarlar soni")
+    parser.add_argument("--command-rate", type=float, default=0.05, help="sun'iy trafikda buyruqlar ulushi")
+    parser.add_argument("--concurrency", type=int, default=32, help="bir vaqtda faol foydalanuvchilar soni")
+    parser.add_argument("--think-ms", type=float, default=0, help="foydalanuvchi xabarlari orasidagi pauza")
+    parser.add_argument("--latency-ms", type=float, default=300, help="soxta Gemini kechikishi (mediana)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="kechikish log-normal taqsimoti sigma'si")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="Gemini xatosi ehtimolligi")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Gemini javob bermasligi ehtimolligi")
+    parser.add_argument("--stream-chunks", type=int, default=4, help="oqimli javobdagi bo'laklar soni")
+    parser.add_argument("--telegram-ms", type=float, default=0, help="soxta Telegram so'rovi kechikishi")
+    parser.add_argument("--trace-memory", action="store_true", help="tracemalloc bilan eng yuqori xotirani o'lchash (sekinroq)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="natija JSON fayli (bo'lmasa stdout)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    output_path = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix="airo-bench-")
+    # Bot moduli vaqtinchalik katalogda, alohida baza va log fayli bilan yuklanadi
+    os.environ["DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.chdir(workdir)
+    if args.trace_memory:
+        tracemalloc.start()
+    import tg
+    # Bot loglari o'lchovga aralashmasin (main() dagi setup_logging bu yerda chaqirilmaydi)
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    conversations, responses = build_traffic(args, rng)
+    model = StubModel(
+        rng, responses, args.latency_ms, args.latency_sigma, args.failure_rate, args.timeout_rate, args.stream_chunks
+    )
+    tg.model = model
+    tg.storage.init_db()
+    bench = Bench(args, tg)
+    wall = asyncio.run(bench.run(conversations))
+    tracemalloc_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    tg.storage.close()
+
+    messages = sum(len(value) for value in bench.latencies.values())
+    result = {
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "users": len(conversations),
+        "messages": messages,
+        "wall_s": round(wall, 3),
+        "throughput_msg_s": round(messages / wall, 1),
+        "handlers": {name: summarize(values) for name, values in bench.latencies.items()},
+        "respond": summarize(bench.respond_latencies),
+        "coalesce_window_ms": round(tg.coalescer.window * 1000, 1),
+        "db": {
+            "tasks_per_msg": round(bench.db_tasks / messages, 3),
+            "statements_per_msg": round(bench.sql_statements / messages, 3),
+        },
+        "memory": {
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "tracemalloc_peak_kb": tracemalloc_peak // 1024 if tracemalloc_peak is not None else None,
+        },
+        "gemini": {"calls": model.calls, "failures": model.failures},
+        "handler_errors": bench.errors,
+        "stats": {
+            "admission": tg.admission.stats(),
+            "coalescer": tg.coalescer.stats(),
+            "response_cache": tg.response_cache.stats(),
+            "history_cache": tg.storage.history.stats(),
+            "context": tg.context_builder.stats(),
+        },
+    }
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
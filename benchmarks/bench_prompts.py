@@ -0,0 +1,176 @@
+import os
+import random
+import re
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompts import LANGUAGES, EMOTIONS, LENGTHS, MAX_TOKENS, finalize_reply, render_prompt
+
+# Prompt yig'ish mikro-benchmarki: har xabarda barcha tillar uchun lug'at va f-string qurish (eski usul)
+# bilan oldindan tayyorlangan shablonlar reyestrini (prompts.py) solishtiradi.
+# Ishga tushirish: python benchmarks/bench_prompts.py
+
+
+# Eski handle_message ichidagi prompt yig'ish (taqqoslash uchun o'zgarishsiz ko'chirilgan)
+def legacy_render(language, emotion, message_length, history_prompt, user_message):
+    # Hissiyotga mos ko'rsatma
+    emotion_instruction = {
+        "uz": {
+            "funny": "Javobni quvnoq, hazilkash va kulgili qil, smayliklar ishlat! 😜",
+            "sad": "Javobni mehribon, tasalli beruvchi va dalda beruvchi qil, foydalanuvchini ko'tar! 😊",
+            "neutral": "Javobni do'stona va hazilkash qil, tabiiy uslubda. 😎",
+        },
+        "ru": {
+            "funny": "Otvechay veselo, s yumorkom i prikolami, ispol'zuy smayliki! 😜",
+            "sad": "Otvechay dobrotno, uteshitel'no i podbadrivayushche, podnimi nastroeniye! 😊",
+            "neutral": "Otvechay po-druzheski i s yumorkom, v natural'nom stile. 😎",
+        },
+        "en": {
+            "funny": "Answer in a fun, witty, and humorous way, use emojis! 😜",
+            "sad": "Answer kindly, comfortingly, and encouragingly, cheer them up! 😊",
+            "neutral": "Answer in a friendly and humorous way, keep it natural. 😎",
+        },
+    }[language][emotion]
+
+    # Javob uzunligi bo'yicha ko'rsatma
+    length_instruction = (
+        "Javobni 1-2 jumlada ber." if message_length == "short" else
+        "Javobni 3-4 jumlada ber." if message_length == "medium" else
+        "Javobni 5-6 jumlada ber."
+    ) if language == "uz" else (
+        "Otvechay v 1-2 predlozheniyakh." if message_length == "short" else
+        "Otvechay v 3-4 predlozheniyakh." if message_length == "medium" else
+        "Otvechay v 5-6 predlozheniyakh."
+    ) if language == "ru" else (
+        "Answer in 1-2 sentences." if message_length == "short" else
+        "Answer in 3-4 sentences." if message_length == "medium" else
+        "Answer in 5-6 sentences."
+    )
+
+    max_tokens = {"short": 100, "medium": 200, "long": 400}[message_length]
+    prompt = {
+        "uz": (
+            "Siz AIRO, o'zbek tilida ravon gaplashadigan, hazilkash va mehribon botsiz! 😊\n"
+            "Hech qachon 'salom', 'assalomu alaykum', 'привет', 'hello' kabi salomlashuv so'zlarini ishlatma, chunki suhbat allaqachon boshlangan.\n"
+            "Foydalanuvchi bilan do'stona suhbatlash, lekin 'ukam', 'do'stim', 'nima los?', 'zo'r-da!' kabi iboralarni faqat vaqti-vaqti bilan ishlat.\n"
+            f"Foydalanuvchi xabarining hissiy ohangi: {emotion}. {emotion_instruction}\n"
+            "Suhbatni uzluksiz davom ettir, oldingi xabarlarni eslab qol va ularga tayan.\n"
+            "Agar savol noaniq bo'lsa, do'stona tarzda so'ra yoki hazil qil! 😜\n"
+            "Javobni oxirigacha to'liq yoz, chala qoldirma.\n"
+            f"{length_instruction}\n"
+            f"Oldingi suhbat (oxirgi xabarlar muhim):\n{history_prompt}\n"
+            f"Foydalanuvchi xabari: {user_message}"
+        ),
+        "ru": (
+            "Ty AIRO, vesyolyy i dobrotnyy bot, boltayushchiy na russkom kak s koreshem! 😊\n"
+            "Nikogda ne ispol'zuy 'привет', 'здравствуйте', 'salom', 'hello' ili podobnyye privetstviya, potomu chto chat uzhe nachalsya.\n"
+            "Ispol'zuy frazy vrode 'bratan', 'koresh', 'chyo za dvizh?', 'puchkom!' tol'ko vremenami, chtoby ne pereborshchit'.\n"
+            f"Ton soobshcheniya pol'zovatelya: {emotion}. {emotion_instruction}\n"
+            "Prodolzhay chat bez poteri konteksta, pomni proshlyye soobshcheniya i opiraysya na nikh.\n"
+            "Esli vopros mutnyy, utochni po-druzheski ili zashuti! 😜\n"
+            "Pishi otvet polnost'yu, ne obryvay.\n"
+            f"{length_instruction}\n"
+            f"Predydushchiy chat (posledniye soobshcheniya vazhny):\n{history_prompt}\n"
+            f"Soobshcheniye pol'zovatelya: {user_message}"
+        ),
+        "en": (
+            "You're AIRO, a witty and kind bot chatting in English with an Uzbek vibe! 😊\n"
+            "Never use 'hello', 'hi', 'salom', 'привет' or any greetings, since the chat is already ongoing.\n"
+            "Use phrases like 'bro', 'mate', 'what's the deal?', 'that's dope!' sparingly to keep it natural.\n"
+            f"User message tone: {emotion}. {emotion_instruction}\n"
+            "Keep the convo flowing, remember past messages, and build on them.\n"
+            "If the question's vague, ask for more in a friendly way or crack a joke! 😜\n"
+            "Write complete answers, don't cut off.\n"
+            f"{length_instruction}\n"
+            f"Previous chat (recent messages matter most):\n{history_prompt}\n"
+            f"User message: {user_message}"
+        ),
+    }[language]
+    return prompt, max_tokens
+
+
+# Eski handle_message ichidagi javobni yakunlash
+def legacy_finalize(bot_response, language, emotion):
+    greeting_patterns = {
+        "uz": r"\b(salom|assalomu alaykum)\b",
+        "ru": r"\b(привет|здравствуйте)\b",
+        "en": r"\b(hello|hi)\b",
+    }
+    bot_response = re.sub(greeting_patterns[language], "", bot_response, flags=re.IGNORECASE).strip()
+    if not bot_response.endswith((".", "!", "?")):
+        bot_response += {
+            "uz": {
+                "funny": ". 😜 Yana nima gap, do'stim?",
+                "sad": ". 😊 Men sen bilanman, nima yordam beray?",
+                "neutral": ". 😄 Nima gaplashamiz?",
+            },
+            "ru": {
+                "funny": ". 😜 Chyo dal'she, koresh?",
+                "sad": ". 😊 Ya s toboy, chem pomoch'?",
+                "neutral": ". 😄 Chyo obsu dim?",
+            },
+            "en": {
+                "funny": ". 😜 What's next, mate?",
+                "sad": ". 😊 I'm here for you, what's up?",
+                "neutral": ". 😄 What's good?",
+            },
+        }[language][emotion]
+    return bot_response
+
+
+def new_render(language, emotion, message_length, history_prompt, user_message):
+    return render_prompt(language, emotion, message_length, history_prompt, user_message), MAX_TOKENS[message_length]
+
+
+def _cases(count):
+    rng = random.Random(42)
+    history = "".join(f"Foydalanuvchi (uz, neutral): savol {i}\njavob {i}\n" for i in range(20))
+    return [
+        (rng.choice(LANGUAGES), rng.choice(EMOTIONS), rng.choice(LENGTHS), history, f"xabar {i}")
+        for i in range(count)
+    ]
+
+
+# Bitta chaqiruvga to'g'ri keladigan o'rtacha vaqt (mikrosoniya) va eng ko'p ajratilgan xotira (bayt)
+def _measure(func, cases, repeat=5):
+    def run():
+        for case in cases:
+            func(*case)
+
+    per_call_us = min(timeit.repeat(run, number=1, repeat=repeat)) / len(cases) * 1e6
+    allocated = 0
+    sample = cases[:2000]
+    tracemalloc.start()
+    for case in sample:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func(*case)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    tracemalloc.stop()
+    return per_call_us, allocated // len(sample)
+
+
+def main():
+    cases = _cases(20000)
+    # Ikkala usul bir xil prompt va javob chiqarishini tekshirish
+    for case in cases[:500]:
+        assert legacy_render(*case) == new_render(*case)
+        assert legacy_finalize("salom do'stim", case[0], case[1]) == finalize_reply("salom do'stim", case[0], case[1])
+
+    replies = [("Salom! Zo'r savol bo'ldi", case[0], case[1]) for case in cases]
+    for name, legacy, new, args in (
+        ("prompt", legacy_render, new_render, cases),
+        ("finalize", legacy_finalize, finalize_reply, replies),
+    ):
+        legacy_us, legacy_bytes = _measure(legacy, args)
+        new_us, new_bytes = _measure(new, args)
+        print(f"{name:>8}  eski: {legacy_us:6.2f} us/xabar, {legacy_bytes:6d} B/xabar")
+        print(f"{name:>8} yangi: {new_us:6.2f} us/xabar, {new_bytes:6d} B/xabar")
+
+
+if __name__ == "__main__":
+    main()
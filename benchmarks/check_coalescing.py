@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from bench_handlers import ROOT, SYNTHETIC_MESSAGES, FakeMessage, StubModel
+
+# Xabarlarni birlashtirish (coalescer) va respond() ning bekor qilish / qayta navbatga qo'yish / commit
+# yo'llarini tekshirish. Har bir foydalanuvchi COALESCE_WINDOW ichida xabarlar to'dasini yuboradi,
+# keyingi to'da esa ko'pincha oldingi javob generatsiya qilinayotganda keladi (Gemini ruxsatigacha
+# partiya bekor qilinib yangi xabarlar bilan birlashadi, ruxsatdan keyin yangi partiya boshlanadi). Kichik tarix keshi bilan
+# sun'iy sekinlashtirilgan sovuq o'qishlar ham bekor qilinadi. Kirish nazorati odatdagi chegaralar bilan
+# ishlaydi: foydalanuvchi USER_BURST dan ko'p to'da yubormaydi, shuning uchun bekor qilingan partiyalar
+# token sarflamasa, birorta so'rov ham tashlanmaydi. Oxirida tekshiriladi:
+#   - har bir xabar aynan bitta saqlangan suhbatga kirgan (yo'qolmagan va takrorlanmagan);
+#   - har bir saqlangan suhbatga aynan bitta javob xabari yuborilgan, boshqa xabarlarga javob yo'q;
+#   - tarix keshidan o'qilgan suhbatlar bazadagisi bilan bir xil va takrorsiz;
+#   - tashlangan (shed) javoblar va bekor qilingan Gemini chaqiruvlari yo'q.
+# Ishga tushirish: python benchmarks/check_coalescing.py --users 20 --bursts 3
+# Muammo topilsa chiqish kodi 1.
+
+
+# Javoblarni xabar bo'yicha sanaydigan soxta Telegram xabari
+class RecordingMessage(FakeMessage):
+    def __init__(self, check, user_id, text):
+        super().__init__(check, user_id, text)
+        self.replies = 0
+
+    async def reply_text(self, text, **kwargs):
+        self.replies += 1
+        return await super().reply_text(text, **kwargs)
+
+
+class CoalescingCheck:
+    def __init__(self, args, tg, rng):
+        self.args = args
+        self.tg = tg
+        self.rng = rng
+        self.sent = {}
+        self.user_data = {}
+        self.duplicated_reads = []
+        self.cancelled_generations = 0
+        texts = [text for language in SYNTHETIC_MESSAGES.values() for text in language]
+        self.canned = tuple(text for text in texts if tg.matcher.classify(text).response is not None)
+        self.generated = tuple(text for text in texts if tg.matcher.classify(text).response is None)
+
+    async def telegram_call(self):
+        await asyncio.sleep(0)
+
+    async def send(self, user_id: int, text: str):
+        message = RecordingMessage(self, user_id, text)
+        update = SimpleNamespace(message=message, effective_user=message.from_user, effective_message=message)
+        context = SimpleNamespace(user_data=self.user_data.setdefault(user_id, {}), args=[], bot=None)
+        self.sent[text] = message
+        await self.tg.handle_message(update, context)
+
+    # Asosan Gemini yo'liga tushadigan xabarlar, qolgani tayyor javoblar (bitta tayyor javobli xabar
+    # butun partiyani tayyor javob yo'liga o'tkazadi)
+    def pool(self) -> tuple:
+        return self.canned if self.rng.random() < self.args.canned_share else self.generated
+
+    # To'dalar orasidagi pauza: oyna ichida (to'dalar birlashadi), partiya tarixni o'qib Gemini ruxsatiga
+    # yetmasdan (partiya bekor qilinadi) yoki generatsiya paytida / undan keyin (yangi partiya)
+    def pause(self, window: float) -> float:
+        case = self.rng.randrange(3)
+        if case == 0:
+            return self.rng.uniform(0, 0.8 * window)
+        if case == 1:
+            return window + self.rng.uniform(0, self.args.db_latency_ms / 1000)
+        return window + self.rng.uniform(0, 2 * self.args.latency_ms / 1000)
+
+    # To'da ichidagi xabarlar oynadan qisqa oraliqda keladi
+    async def user_session(self, user_id: int):
+        window = self.tg.coalescer.window
+        number = 0
+        await asyncio.sleep(self.rng.uniform(0, self.args.spread))
+        for _ in range(self.args.bursts):
+            for index in range(self.rng.randint(1, self.args.burst_size)):
+                if index:
+                    await asyncio.sleep(self.rng.uniform(0, 0.6 * window))
+                text = f"{self.rng.choice(self.pool())} #{user_id}-{number}"
+                number += 1
+                await self.send(user_id, text)
+            await asyncio.sleep(self.pause(window))
+
+    async def run(self) -> list:
+        tg = self.tg
+        users = [9_000_000 + index for index in range(self.args.users)]
+        get_chat_history = tg.storage.get_chat_history
+        run_db = tg.storage._run
+
+        # Sekin disk: bazadan o'qish paytida ham partiya bekor qilinishi mumkin bo'lsin. Kechikish DB
+        # oqimida qo'shiladi, shuning uchun so'rovlar tartibi (flush -> o'qish) o'zgarmaydi
+        async def slow_run(func, *args):
+            delay = self.rng.uniform(0, 2 * self.args.db_latency_ms / 1000)
+
+            def slow(*args):
+                time.sleep(delay)
+                return func(*args)
+
+            return await run_db(slow, *args)
+
+        # Bot ishlatadigan har bir tarix o'qilishi takroriy suhbatlarsiz bo'lishi kerak (keyinchalik
+        # keshdan chiqarilgan foydalanuvchilar uchun ham)
+        async def checked_history(user_id, *args, **kwargs):
+            rows = await get_chat_history(user_id, *args, **kwargs)
+            if len(set(rows)) != len(rows):
+                self.duplicated_reads.append(user_id)
+            return rows
+
+        # Ruxsat olingan Gemini chaqiruvi yangi xabar tufayli bekor qilinmasligi kerak
+        def counted(generate):
+            async def call(*args):
+                try:
+                    return await generate(*args)
+                except asyncio.CancelledError:
+                    self.cancelled_generations += 1
+                    raise
+
+            return call
+
+        generate_text, stream_text = tg.generate_text, tg.stream_text
+        tg.storage.get_chat_history = checked_history
+        tg.storage._run = slow_run
+        tg.generate_text, tg.stream_text = counted(generate_text), counted(stream_text)
+        try:
+            await asyncio.gather(*(self.user_session(user_id) for user_id in users))
+        finally:
+            tg.storage.get_chat_history = get_chat_history
+            tg.storage._run = run_db
+            tg.generate_text, tg.stream_text = generate_text, stream_text
+        await tg.coalescer.drain()
+        await tg.storage.flush()
+        return await self.verify(users)
+
+    async def verify(self, users: list) -> list:
+        tg = self.tg
+        problems = [f"foydalanuvchi {user_id}: tarix o'qilishida takroriy suhbatlar" for user_id in self.duplicated_reads]
+        if self.cancelled_generations:
+            problems.append(f"bekor qilingan Gemini chaqiruvlari: {self.cancelled_generations}")
+        shed = {reason: count for reason, count in tg.admission.shed.items() if count and reason != "background"}
+        if shed:
+            problems.append(f"tashlangan so'rovlar: {shed}")
+        turns = await tg.storage._run(
+            lambda: tg.storage._connection().execute(
+                "SELECT user_id, message FROM chat_history ORDER BY ts, rowid"
+            ).fetchall()
+        )
+        covered = Counter(text for _, message in turns for text in message.split("\n"))
+        for text, message in self.sent.items():
+            if covered[text] != 1:
+                problems.append(f"xabar {covered[text]} ta suhbatda: {text!r}")
+        # Har bir suhbat oxirgi xabariga bitta javob oladi, partiyadagi boshqa xabarlarga javob yo'q
+        last_texts = {message.split("\n")[-1] for _, message in turns}
+        for text, message in self.sent.items():
+            expected = 1 if text in last_texts else 0
+            if message.replies != expected:
+                problems.append(f"{message.replies} ta javob (kutilgan {expected}): {text!r}")
+        # Keshdagi tarix bazadagi bilan bir xil va takrorsiz
+        for user_id in users:
+            cached = [row[:2] for row in await tg.storage.get_chat_history(user_id, max_messages=tg.storage.history.turns)]
+            stored = [
+                row[:2]
+                for row in await tg.storage._run(tg.storage._get_chat_history, user_id, 0, tg.storage.history.turns)
+            ]
+            if len(set(cached)) != len(cached):
+                problems.append(f"foydalanuvchi {user_id}: tarixda takroriy suhbatlar")
+            elif cached != stored[:len(cached)]:
+                problems.append(f"foydalanuvchi {user_id}: kesh va baza tarixi farq qiladi")
+        return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xabarlarni birlashtirish va javoblar to'g'riligini tekshirish")
+    parser.add_argument("--users", type=int, default=20, help="foydalanuvchilar soni")
+    parser.add_argument("--spread", type=float, default=5, help="foydalanuvchilar shu oraliqda (soniya) boshlaydi")
+    parser.add_argument("--bursts", type=int, default=3,
+                        help="har bir foydalanuvchi yuboradigan to'dalar soni (USER_BURST dan oshmasin)")
+    parser.add_argument("--burst-size", type=int, default=4, help="to'dadagi eng ko'p xabarlar soni")
+    parser.add_argument("--window", type=float, default=0.2, help="COALESCE_WINDOW (soniya)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="soxta Gemini kechikishi (mediana)")
+    parser.add_argument("--db-latency-ms", type=float, default=10, help="baza so'rovlarining sun'iy kechikishi (o'rtacha)")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Gemini xatosi ehtimolligi")
+    parser.add_argument("--stream-chunks", type=int, default=4, help="oqimli javobdagi bo'laklar soni")
+    parser.add_argument("--cache-users", type=int, default=5, help="HISTORY_CACHE_USERS (kichik - ko'p sovuq o'qish)")
+    parser.add_argument("--canned-share", type=float, default=0.1, help="tayyor javobli xabarlar ulushi")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="airo-coalesce-")
+    # Bot moduli vaqtinchalik katalogda, alohida baza bilan yuklanadi
+    os.environ["DB_PATH"] = os.path.join(workdir, "check.db")
+    os.environ["COALESCE_WINDOW"] = str(args.window)
+    os.environ["HISTORY_CACHE_USERS"] = str(args.cache_users)
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    import tg
+
+    logging.getLogger().addHandler(logging.NullHandler())
+    responses = ["Zo'r savol! Keling, birga o'ylab ko'ramiz.", "Great question, mate! Let's figure it out. " * 4]
+    model = StubModel(rng, responses, args.latency_ms, 0.5, args.failure_rate, 0.0, args.stream_chunks)
+    tg.model = model
+    tg.storage.init_db()
+    check = CoalescingCheck(args, tg, rng)
+    problems = asyncio.run(check.run())
+    tg.storage.close()
+
+    result = {
+        "messages": len(check.sent),
+        "coalescer": tg.coalescer.stats(),
+        "history_cache": tg.storage.history.stats(),
+        "admission": tg.admission.stats(),
+        "gemini": {"calls": model.calls, "failures": model.failures},
+        "problems": len(problems),
+        "examples": problems[:10],
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Bir foydalanuvchining ketma-ket xabarlarini bitta javobga birlashtirish oynasi (soniya).
+# Oxirgi xabardan keyin shuncha vaqt yangi xabar kelmasa, to'plangan xabarlar qayta ishlanadi
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0.7"))
+# Bitta javobga birlashtiriladigan xabarlar soni chegarasi
+COALESCE_MAX_MESSAGES = int(os.getenv("COALESCE_MAX_MESSAGES", "10"))
+
+
+# Bitta foydalanuvchining navbati: kutilayotgan xabarlar, oyna taymeri va ishlayotgan partiya
+class _UserQueue:
+    __slots__ = ("pending", "timer", "task", "committed")
+
+    def __init__(self):
+        self.pending = []
+        self.timer = None
+        self.task = None
+        # True bo'lsa, partiya javob yubora boshlagan va endi bekor qilinmaydi
+        self.committed = False
+
+
+# Foydalanuvchi xabarlarini to'plab, bitta partiya sifatida process(user_id, items) ga berish.
+# Har bir foydalanuvchi uchun bir vaqtda faqat bitta partiya ishlaydi, shuning uchun javoblar tartibi
+# saqlanadi. Partiya commit() qilinmaguncha yangi xabar kelsa, u bekor qilinadi va uning xabarlari
+# yangilari bilan birga keyingi partiyaga qo'shiladi
+class MessageCoalescer:
+    def __init__(self, process, window: float = COALESCE_WINDOW, max_messages: int = COALESCE_MAX_MESSAGES):
+        self.process = process
+        self.window = window
+        self.max_messages = max_messages
+        self._users = {}
+        self.received = 0
+        self.batches = 0
+        self.superseded = 0
+
+    def submit(self, user_id: int, item) -> None:
+        queue = self._users.get(user_id)
+        if queue is None:
+            queue = self._users[user_id] = _UserQueue()
+        queue.pending.append(item)
+        self.received += 1
+        if queue.task is not None and not queue.committed:
+            queue.task.cancel()
+        if queue.timer is not None:
+            queue.timer.cancel()
+        delay = 0 if len(queue.pending) >= self.max_messages else self.window
+        queue.timer = asyncio.get_running_loop().call_later(delay, self._fire, user_id, queue)
+
+    # Partiya yakuniy (Gemini ruxsati olingan yoki javob yuborilmoqda): shundan keyin kelgan xabarlar keyingi partiyaga qoladi
+    def commit(self, user_id: int) -> None:
+        queue = self._users.get(user_id)
+        if queue is not None and queue.task is not None:
+            queue.committed = True
+
+    def _fire(self, user_id: int, queue: _UserQueue) -> None:
+        queue.timer = None
+        # Oldingi partiya hali tugamagan bo'lsa, u tugagach navbat qayta tekshiriladi
+        if queue.task is not None:
+            return
+        batch = queue.pending[:self.max_messages]
+        del queue.pending[:self.max_messages]
+        queue.committed = False
+        queue.task = asyncio.create_task(self._run(user_id, queue, batch))
+
+    async def _run(self, user_id: int, queue: _UserQueue, batch: list) -> None:
+        try:
+            await self.process(user_id, batch)
+            self.batches += 1
+        except asyncio.CancelledError:
+            # Yangi xabarsiz bekor qilish (masalan, bot to'xtashi) odatdagidek davom etadi
+            if not queue.pending:
+                raise
+            # Yangi xabar kelib, partiya eskirdi: xabarlar navbat boshiga qaytariladi
+            self.superseded += 1
+            queue.pending[:0] = batch
+        except Exception:
+            logger.exception("Xabarlar partiyasini qayta ishlashda xato", extra={"user_id": user_id})
+        finally:
+            queue.task = None
+            if queue.pending:
+                if queue.timer is None:
+                    self._fire(user_id, queue)
+            elif queue.timer is None:
+                self._users.pop(user_id, None)
+
+    # Foydalanuvchining oynasi tugamagan xabarlarini darhol qayta ishlash va uning barcha partiyalarini kutish.
+    # Buyruqlar shundan keyin bajariladi: oldin yuborilgan xabarlarga javob buyruqdan oldin keladi
+    async def flush(self, user_id: int) -> None:
+        queue = self._users.get(user_id)
+        while queue is not None:
+            if queue.timer is not None:
+                queue.timer.cancel()
+                self._fire(user_id, queue)
+            if queue.task is None:
+                break
+            await asyncio.wait([queue.task])
+            queue = self._users.get(user_id)
+
+    # Bot to'xtashida: oynasi tugamagan xabarlarni darhol qayta ishlash va barcha partiyalarni kutish
+    async def drain(self) -> None:
+        while self._users:
+            for user_id, queue in list(self._users.items()):
+                if queue.timer is not None:
+                    queue.timer.cancel()
+                    self._fire(user_id, queue)
+            tasks = [queue.task for queue in self._users.values() if queue.task is not None]
+            if not tasks:
+                break
+            await asyncio.wait(tasks)
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "batches": self.batches,
+            "superseded": self.superseded,
+            "active_users": len(self._users),
+        }
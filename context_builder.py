@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Suhbat tarixi uchun token chegarasi: (til, savol uzunligi) -> token
+HISTORY_TOKEN_BUDGETS = {
+    ("uz", "short"): 500,
+    ("uz", "medium"): 900,
+    ("uz", "long"): 1500,
+    ("ru", "short"): 600,
+    ("ru", "medium"): 1000,
+    ("ru", "long"): 1700,
+    ("en", "short"): 500,
+    ("en", "medium"): 900,
+    ("en", "long"): 1500,
+}
+# Tokenlarni taxminlash: bitta token o'rtacha necha belgiga to'g'ri keladi
+CHARS_PER_TOKEN = {"uz": 4, "ru": 3, "en": 4}
+
+# Xulosaga qo'shilmagan eski suhbatlar shu songa yetganda xulosa yangilanadi
+SUMMARY_MIN_TURNS = int(os.getenv("SUMMARY_MIN_TURNS", "6"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+# Xotirada saqlanadigan xulosalar soni
+SUMMARY_CACHE_USERS = int(os.getenv("SUMMARY_CACHE_USERS", "10000"))
+
+SUMMARY_HEADERS = {
+    "uz": "Avvalgi suhbat xulosasi: ",
+    "ru": "Kratko o predydushchem chate: ",
+    "en": "Summary of the earlier chat: ",
+}
+
+SUMMARY_PROMPTS = {
+    "uz": (
+        "Quyidagi suhbatning qisqa xulosasini o'zbek tilida 3-5 jumlada yoz.\n"
+        "Foydalanuvchi haqidagi muhim faktlarni, muhokama qilingan mavzularni va kayfiyatni saqla.\n"
+        "Oldingi xulosa:\n{summary}\n"
+        "Yangi xabarlar:\n{turns}"
+    ),
+    "ru": (
+        "Napishi kratkoye soderzhaniye etogo chata na russkom v 3-5 predlozheniyakh.\n"
+        "Sokhrani vazhnyye fakty o pol'zovatele, temy razgovora i nastroeniye.\n"
+        "Predydushcheye soderzhaniye:\n{summary}\n"
+        "Novyye soobshcheniya:\n{turns}"
+    ),
+    "en": (
+        "Write a short summary of this chat in English in 3-5 sentences.\n"
+        "Keep the important facts about the user, the topics discussed and the mood.\n"
+        "Previous summary:\n{summary}\n"
+        "New messages:\n{turns}"
+    ),
+}
+
+
+# Matndagi tokenlar sonini taxminlash (aniq tokenizator chaqirilmaydi)
+def estimate_tokens(text: str, language: str) -> int:
+    return len(text) // CHARS_PER_TOKEN.get(language, 4) + 1
+
+
+# Bitta suhbatni prompt qatoriga aylantirish: (message, response, language, emotion, ts)
+def format_turn(row: tuple) -> str:
+    return f"Foydalanuvchi ({row[2]}, {row[3]}): {row[0]}\n{row[1]}\n"
+
+
+# Gemini promptidagi suhbat tarixini token chegarasida yig'ish.
+# So'nggi suhbatlar so'zma-so'z qoladi, eskilari esa har bir foydalanuvchi uchun saqlanadigan
+# xulosaga jamlanadi. Xulosa har so'rovda emas, yetarlicha yangi eski suhbat to'planganda
+# fon rejimida bosqichma-bosqich yangilanadi.
+class ContextBuilder:
+    def __init__(self, storage, summarize):
+        self.storage = storage
+        # summarize(prompt, max_tokens) -> str (Gemini chaqiruvi) yoki None (so'rovga ruxsat berilmadi)
+        self.summarize = summarize
+        self._summaries = OrderedDict()
+        self._in_flight = {}
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.summaries_generated = 0
+        self.summaries_skipped = 0
+
+    # Foydalanuvchi xulosasini olish: (matn, xulosaga kirgan oxirgi ts) yoki None
+    async def _get_summary(self, user_id: int):
+        if user_id in self._summaries:
+            self._summaries.move_to_end(user_id)
+            return self._summaries[user_id]
+        summary = await self.storage.get_summary(user_id)
+        self._remember(user_id, summary)
+        return summary
+
+    def _remember(self, user_id: int, summary):
+        self._summaries[user_id] = summary
+        self._summaries.move_to_end(user_id)
+        while len(self._summaries) > SUMMARY_CACHE_USERS:
+            self._summaries.popitem(last=False)
+
+    # Suhbat tarixi matnini yig'ish. rows: get_chat_history natijasi (yangidan eskiga).
+    # Chegaraga sig'magan va hali xulosaga kirmagan suhbatlar xulosa yangilanguncha promptga kirmaydi
+    async def build(self, user_id: int, language: str, message_length: str, rows: list) -> str:
+        summary = await self._get_summary(user_id)
+        covered_ts = summary[1] if summary else None
+        summary_text = f"{SUMMARY_HEADERS[language]}{summary[0]}\n" if summary else ""
+
+        budget = HISTORY_TOKEN_BUDGETS[(language, message_length)] - estimate_tokens(summary_text, language)
+        recent = []
+        overflow = []
+        used = 0
+        full = 0
+        verbatim = True
+        for row in rows:
+            line = format_turn(row)
+            cost = estimate_tokens(line, language)
+            full += cost
+            # ts soniyalarda: chegaraviy soniyadagi suhbat ham xulosada, ham so'zma-so'z bo'lishi mumkin,
+            # lekin hech qachon ikkalasidan ham tushib qolmaydi
+            if verbatim and (covered_ts is None or row[4] >= covered_ts) and used + cost <= budget:
+                recent.append(line)
+                used += cost
+                continue
+            verbatim = False
+            if covered_ts is None or row[4] > covered_ts:
+                overflow.append(row)
+
+        if len(overflow) >= SUMMARY_MIN_TURNS and user_id not in self._in_flight:
+            task = asyncio.create_task(self._update_summary(user_id, language, summary, overflow[::-1]))
+            self._in_flight[user_id] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(user_id, None))
+
+        history_prompt = summary_text + "".join(reversed(recent))
+        after = estimate_tokens(history_prompt, language) if history_prompt else 0
+        self.requests += 1
+        self.tokens_before += full
+        self.tokens_after += after
+        logger.debug("Prompt tarixi: %d -> %d token", full, after, extra={"user_id": user_id, "language": language})
+        return history_prompt
+
+    # Eski xulosa va yangi eski suhbatlardan (eskidan yangiga) yangi xulosa yaratish
+    async def _update_summary(self, user_id: int, language: str, summary, turns: list):
+        prompt = SUMMARY_PROMPTS[language].format(
+            summary=summary[0] if summary else "-",
+            turns="".join(format_turn(row) for row in turns),
+        )
+        try:
+            text = await self.summarize(prompt, SUMMARY_MAX_TOKENS)
+            if text is None:
+                # Keyingi so'rovda qayta uriniladi (suhbatlar hali xulosaga kirmagan)
+                self.summaries_skipped += 1
+                return
+            text = text.strip()
+            if not text:
+                return
+            covered_ts = turns[-1][4]
+            await self.storage.save_summary(user_id, text, covered_ts)
+            self._remember(user_id, (text, covered_ts))
+            self.summaries_generated += 1
+        except Exception as e:
+            logger.error("Suhbat xulosasini yangilashda xato: %s", e, extra={"user_id": user_id})
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "prompt_tokens_before": self.tokens_before,
+            "prompt_tokens_after": self.tokens_after,
+            "saved_ratio": round(1 - self.tokens_after / self.tokens_before, 3) if self.tokens_before else 0.0,
+            "summaries_generated": self.summaries_generated,
+            "summaries_skipped": self.summaries_skipped,
+        }
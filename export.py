@@ -1,46 +1,241 @@
-import sqlite3
+import argparse
+import gzip
+import heapq
+import importlib.util
 import json
 import os
+import sqlite3
+import sys
+from datetime import datetime
+
+from sharding import all_db_paths
+from storage import MIGRATIONS, backfill_timestamps_batch, migrate
+
+# Suhbat tarixini dataset sifatida eksport qilish: har qatorda bitta JSON yozuv (JSONL), kerak bo'lsa
+# gzip yoki zstd bilan siqilgan. Bazalar bo'laklab o'qiladi, shuning uchun xotira jadval hajmiga bog'liq emas.
+#   python export.py -o airo_dataset.jsonl.gz
+#   python export.py -o dataset-$(date +%F).jsonl.zst --state export_state.json --language uz --since 2025-06-01
+
+# Bazadan bir martada o'qiladigan qatorlar soni
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# Qo'shilish tartibi (rowid) bo'yicha keyset: oxirgi eksport qilingan qatordan keyin yozilgan barcha qatorlar
+# olinadi. ts kursor bo'la olmaydi: eksportdan keyin yozilgan qatorning ts qiymati watermark'dan eski bo'lishi
+# mumkin (fonda ts to'ldirilgan eski yozuvlar, navbatda kutib keyinroq yozilgan xabarlar) va u o'tkazib yuborilardi
+SQL_EXPORT_ROWS = (
+    "SELECT ts, rowid, user_id, message, response, timestamp, language, emotion FROM chat_history "
+    "WHERE rowid > ?{filters} ORDER BY rowid"
+)
 
-def export_db_to_json(db_path, output_json_path):
+
+# Bitta bazadagi qatorlarni watermark'dan (rowid) keyin qo'shilish tartibida bo'laklab o'qish: (ts, rowid, path, row)
+def iter_rows(path: str, watermark: int, filters: str, params: list, chunk_size: int = EXPORT_CHUNK_SIZE):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
     try:
-        # SQLite ma'lumotlar bazasiga ulanish
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Barcha ma'lumotlarni olish
-        c.execute("SELECT user_id, message, response, timestamp, language FROM chat_history")
-        data = c.fetchall()
-        
-        # JSON formatiga o'girish
-        dataset = [
-            {
-                "user_id": row[0],
-                "prompt": row[1],    # Foydalanuvchi xabari
-                "response": row[2],  # Bot javobi
-                "timestamp": row[3],
-                "language": row[4]
-            }
-            for row in data
-        ]
-        
-        # JSON fayliga yozish
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(dataset, f, ensure_ascii=False, indent=2)
-        
-        print(f"Ma'lumotlar muvaffaqiyatli eksport qilindi: {output_json_path}")
-        
-    except Exception as e:
-        print(f"Xato yuz berdi: {e}")
+        cursor = conn.execute(SQL_EXPORT_ROWS.format(filters=filters), [watermark] + params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0], row[1], path, row[2:]
     finally:
         conn.close()
 
-# Fayl yo'llari
-db_path = "/home/cmatrix/Desktop/TG/chat_history.db"
-output_json_path = "/home/cmatrix/Desktop/TG/airo_dataset.json"
 
-# Skriptni ishga tushirish
-if os.path.exists(db_path):
-    export_db_to_json(db_path, output_json_path)
-else:
-    print(f"Ma'lumotlar bazasi topilmadi: {db_path}")
\ No newline at end of file
+# Bot hali yangilamagan (eski sxemadagi yoki ts ustuni to'liq to'ldirilmagan) bazani eksportga tayyorlash:
+# migratsiyalar va ts to'ldirish botdagi bilan bir xil. Natija: to'ldirilgan qatorlar soni
+def prepare_database(path: str) -> int:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        untimed = version >= 2 and conn.execute("SELECT 1 FROM chat_history WHERE ts IS NULL LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    if version >= len(MIGRATIONS) and not untimed:
+        return 0
+    print(f"{path}: sxema yangilanmoqda (versiya {version} -> {len(MIGRATIONS)})", file=sys.stderr)
+    conn = sqlite3.connect(path)
+    try:
+        migrate(conn)
+        total = 0
+        while True:
+            count = backfill_timestamps_batch(conn)
+            if not count:
+                return total
+            total += count
+    finally:
+        conn.close()
+
+
+# Til, kayfiyat va sana filtrlari uchun SQL sharti va parametrlari
+def build_filters(languages: list = None, emotions: list = None, since: int = None, until: int = None) -> tuple:
+    clauses = []
+    params = []
+    if languages:
+        clauses.append(f"language IN ({', '.join('?' * len(languages))})")
+        params.extend(languages)
+    if emotions:
+        clauses.append(f"emotion IN ({', '.join('?' * len(emotions))})")
+        params.extend(emotions)
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(until)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+# Watermark fayli: har bir baza uchun oxirgi eksport qilingan rowid (eski formatdagi [ts, rowid] ham o'qiladi).
+# rowid faqat bitta fayl ichida ma'noga ega, shuning uchun bazalar alohida kuzatiladi.
+# sharding.rebalance() qatorlarni boshqa faylga ko'chiradi, to'liq VACUUM (storage.py --vacuum) esa
+# chat_history rowid'larini qayta raqamlashi mumkin; ikkalasidan keyin ham to'liq eksport qilish kerak
+def load_state(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        databases = json.load(f).get("databases", {})
+    return {db: mark[-1] if isinstance(mark, list) else mark for db, mark in databases.items()}
+
+
+def save_state(path: str, state: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"databases": state}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Fayl kengaytmasi bo'yicha siqish turi: .gz - gzip, .zst - zstd, qolganlari siqilmaydi
+def compression_for(path: str, compress: str = "auto") -> str:
+    if compress != "auto":
+        return compress
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+
+def open_text(path: str, mode: str, compression: str):
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == "zstd":
+        # Ixtiyoriy bog'liqlik: faqat zstd tanlanganda kerak
+        import zstandard
+
+        return zstandard.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _record(row: tuple, ts: int) -> dict:
+    user_id, message, response, timestamp, language, emotion = row
+    return {
+        "user_id": user_id,
+        "prompt": message,  # Foydalanuvchi xabari
+        "response": response,  # Bot javobi
+        "timestamp": timestamp,
+        "ts": ts,
+        "language": language,
+        "emotion": emotion,
+    }
+
+
+# Barcha bazalardan yozuvlarni JSONL qilib yozish: har bir baza qo'shilish tartibida o'qiladi (u deyarli
+# vaqt tartibiga mos), bazalar esa ts bo'yicha navbatma-navbat birlashtiriladi.
+# Natija avval vaqtinchalik faylga yoziladi va muvaffaqiyatli tugagandagina joyiga ko'chiriladi,
+# watermark ham shundan keyin saqlanadi, shuning uchun to'xtab qolgan eksportni qayta ishga tushirish xavfsiz.
+# Natija: eksport qilingan yozuvlar soni
+def export_jsonl(db_paths: list, output_path: str, state_path: str = None, compress: str = "auto",
+                 filters: tuple = ("", []), chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    state = load_state(state_path)
+    sources = [
+        iter_rows(path, state.get(os.path.abspath(path), 0), filters[0], filters[1], chunk_size)
+        for path in db_paths
+    ]
+    to_stdout = output_path == "-"
+    tmp_path = output_path if to_stdout else f"{output_path}.tmp"
+    out = sys.stdout if to_stdout else open_text(tmp_path, "w", compression_for(output_path, compress))
+    count = 0
+    try:
+        for ts, rowid, path, row in heapq.merge(*sources, key=lambda item: item[0]):
+            out.write(json.dumps(_record(row, ts), ensure_ascii=False))
+            out.write("\n")
+            state[os.path.abspath(path)] = rowid
+            count += 1
+    except BaseException:
+        if not to_stdout:
+            out.close()
+            os.remove(tmp_path)
+        raise
+    if to_stdout:
+        out.flush()
+    else:
+        out.close()
+        os.replace(tmp_path, output_path)
+    if state_path:
+        save_state(state_path, state)
+    return count
+
+
+# Eksport qilingan datasetni o'qish: JSONL (siqilgan ham) yoki eski formatdagi JSON ro'yxat
+def iter_dataset(path: str):
+    with open_text(path, "r", compression_for(path)) as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        if first == "[":
+            yield from json.loads(first + f.read())
+            return
+        rest = f.readline()
+        if (first + rest).strip():
+            yield json.loads(first + rest)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _epoch(value: str) -> int:
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suhbat tarixini JSONL dataset sifatida eksport qilish")
+    parser.add_argument("-o", "--output", default="airo_dataset.jsonl", help="natija fayli ('-' - stdout)")
+    parser.add_argument("--db", action="append", help="baza fayli (takrorlash mumkin; odatda barcha shard bazalari)")
+    parser.add_argument("--compress", choices=("auto", "none", "gzip", "zstd"), default="auto",
+                        help="siqish (auto - kengaytma bo'yicha: .gz, .zst)")
+    parser.add_argument("--state", help="watermark fayli: berilsa faqat oldingi eksportdan keyingi yozuvlar chiqariladi")
+    parser.add_argument("--language", action="append", help="faqat shu til (takrorlash mumkin)")
+    parser.add_argument("--emotion", action="append", help="faqat shu kayfiyat (takrorlash mumkin)")
+    parser.add_argument("--since", help="shu sanadan boshlab (YYYY-MM-DD yoki YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--until", help="shu sanagacha (kirmaydi)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="bir martada o'qiladigan qatorlar")
+    args = parser.parse_args()
+
+    compression = "none" if args.output == "-" else compression_for(args.output, args.compress)
+    if compression == "zstd" and importlib.util.find_spec("zstandard") is None:
+        parser.error("zstd uchun 'zstandard' paketi kerak (pip install zstandard)")
+    try:
+        since = _epoch(args.since) if args.since else None
+        until = _epoch(args.until) if args.until else None
+    except ValueError as e:
+        parser.error(f"noto'g'ri sana: {e}")
+
+    db_paths = args.db or all_db_paths()
+    missing = [path for path in db_paths if not os.path.exists(path)]
+    if not db_paths or missing:
+        parser.error(f"Ma'lumotlar bazasi topilmadi: {', '.join(missing) or 'chat_history.db'}")
+
+    filters = build_filters(args.language, args.emotion, since, until)
+    try:
+        for path in db_paths:
+            prepare_database(path)
+        count = export_jsonl(db_paths, args.output, args.state, compression, filters, args.chunk_size)
+    except sqlite3.Error as e:
+        parser.error(f"ma'lumotlar bazasini o'qib bo'lmadi: {e}")
+    print(f"Ma'lumotlar muvaffaqiyatli eksport qilindi: {count} ta yozuv -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
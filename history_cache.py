@@ -0,0 +1,118 @@
+import os
+from collections import OrderedDict, deque
+
+# Har bir foydalanuvchi uchun xotirada saqlanadigan so'nggi suhbatlar soni
+HISTORY_CACHE_TURNS = int(os.getenv("HISTORY_CACHE_TURNS", "100"))
+# Keshdagi foydalanuvchilar soni va umumiy hajm chegarasi (taxminiy, baytda)
+HISTORY_CACHE_USERS = int(os.getenv("HISTORY_CACHE_USERS", "10000"))
+HISTORY_CACHE_MAX_BYTES = int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Bitta yozuvning qo'shimcha xarajati (tuple, deque tuguni va h.k.) uchun taxminiy qiymat
+ROW_OVERHEAD = 120
+
+
+# Yozuv hajmini taxminlash: (message, response, language, emotion, ts)
+def _row_size(row: tuple) -> int:
+    return len(row[0]) + len(row[1]) + ROW_OVERHEAD
+
+
+# Bitta foydalanuvchining keshi: so'nggi yozuvlar halqasi va u qaysi vaqtdan boshlab to'liqligi
+class _UserHistory:
+    __slots__ = ("rows", "since", "size")
+
+    def __init__(self, rows: deque, since: int, size: int):
+        self.rows = rows
+        self.since = since
+        self.size = size
+
+
+# Foydalanuvchilar bo'yicha so'nggi suhbatlar keshi (LRU, hajm chegarasi bilan).
+# Yozuvlar eskidan yangiga tartiblangan: (message, response, language, emotion, ts)
+class HistoryCache:
+    def __init__(self, turns: int = HISTORY_CACHE_TURNS, max_users: int = HISTORY_CACHE_USERS,
+                 max_bytes: int = HISTORY_CACHE_MAX_BYTES):
+        self.turns = turns
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self._users = OrderedDict()
+        # Bazadan yuklanayotgan foydalanuvchilar: yuklash paytida qo'shilgan yozuvlar shu yerda kutadi
+        self._warming = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Keshdan so'nggi yozuvlarni olish (yangidan eskiga). Kesh bu so'rovga javob bera olmasa None
+    def get(self, user_id: int, since: int, limit: int):
+        entry = self._users.get(user_id)
+        if entry is None or limit > self.turns:
+            self.misses += 1
+            return None
+        result = []
+        for row in reversed(entry.rows):
+            if row[4] < since or len(result) >= limit:
+                break
+            result.append(row)
+        else:
+            # Halqa tugadi: undan eskiroq yozuvlar faqat keshlangan oraliqdan tashqarida bo'lishi mumkin
+            if since < entry.since and len(result) < limit:
+                self.misses += 1
+                return None
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        return result
+
+    # Yangi yozuvni qo'shish (faqat keshdagi yoki yuklanayotgan foydalanuvchilar uchun)
+    def append(self, user_id: int, row: tuple):
+        entry = self._users.get(user_id)
+        if entry is None:
+            if user_id in self._warming:
+                self._warming[user_id].append(row)
+            return
+        if len(entry.rows) == entry.rows.maxlen:
+            removed = _row_size(entry.rows[0])
+            entry.size -= removed
+            self._bytes -= removed
+        entry.rows.append(row)
+        size = _row_size(row)
+        entry.size += size
+        self._bytes += size
+        self._evict()
+
+    # Bazadan yuklash boshlanishi: shu paytdan keyin qo'shilgan yozuvlar yo'qolmasligi uchun
+    def start_warm(self, user_id: int):
+        self._warming.setdefault(user_id, [])
+
+    # Bazadan yuklash muvaffaqiyatsiz bo'lsa, kutayotgan yozuvlarni tashlab yuborish
+    def cancel_warm(self, user_id: int):
+        self._warming.pop(user_id, None)
+
+    # Bazadan o'qilgan yozuvlar (yangidan eskiga) bilan keshni to'ldirish
+    def finish_warm(self, user_id: int, rows: list, since: int):
+        late_rows = self._warming.pop(user_id, [])
+        if user_id in self._users:
+            return
+        history = deque(reversed(rows), maxlen=self.turns)
+        history.extend(late_rows)
+        size = sum(_row_size(row) for row in history)
+        self._users[user_id] = _UserHistory(history, since, size)
+        self._bytes += size
+        self._evict()
+
+    # Eng uzoq ishlatilmagan foydalanuvchilarni chiqarib yuborish
+    def _evict(self):
+        while self._users and (len(self._users) > self.max_users or self._bytes > self.max_bytes):
+            _, entry = self._users.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "users": len(self._users),
+            "bytes": self._bytes,
+        }
@@ -0,0 +1,126 @@
+import copy
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+# Log fayli, darajasi va formati ("json" - har qatorda bitta JSON yozuv, "text" - oddiy matn)
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Aylantirish: LOG_ROTATE_WHEN berilsa vaqt bo'yicha (masalan "midnight"), aks holda hajm bo'yicha.
+# Eski fayllar gzip bilan siqiladi va LOG_BACKUPS tasi saqlanadi
+LOG_ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "10"))
+# Yozuvchi oqim navbati hajmi: to'lsa yangi yozuvlar tashlanadi (handler hech qachon kutmaydi)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# logger.xxx(..., extra={...}) orqali beriladigan tuzilgan maydonlar
+STRUCTURED_FIELDS = ("user_id", "language", "handler", "stage", "outcome", "latency_ms", "stages", "update_id")
+
+_listener = None
+_queue_handler = None
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+# Har bir yozuvni bitta JSON qatorga aylantirish
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Navbat to'lganda kutmasdan yozuvni tashlaydigan QueueHandler
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    # Xabar matni shu yerda (yozuv yoqilgan bo'lsa) bir marta yig'iladi, istisno izi esa alohida
+    # maydonda qoladi, shuning uchun JSON'da "exception" sifatida chiqadi
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler(path: str) -> logging.Handler:
+    if LOG_ROTATE_WHEN:
+        handler = TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUPS, encoding="utf-8")
+    else:
+        handler = RotatingFileHandler(path, maxBytes=LOG_ROTATE_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+# Logging'ni sozlash: event loop oqimida yozuvlar faqat navbatga qo'yiladi, faylga yozish,
+# formatlash va aylantirish alohida oqimda (QueueListener) bajariladi.
+# Qayta chaqirilsa (masalan, fork qilingan ishchida) avvalgi sozlama almashtiriladi
+def setup_logging(path: str = LOG_FILE):
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, _file_handler(path), respect_handler_level=True)
+    _listener.start()
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+    # httpx har bir Telegram so'rovini INFO darajasida yozadi
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+# Navbatda qolgan yozuvlarni faylga yozib, yozuvchi oqimni to'xtatish
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict:
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
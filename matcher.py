@@ -0,0 +1,139 @@
+from typing import NamedTuple
+
+# Til belgilari: shu so'zlar xabar ichida uchrasa, til ovoziga qo'shiladi
+LANGUAGE_WORDS = {
+    "uz": ("salom", "nima", "yaxshimisiz", "qalesan", "nima gap", "yaxshilikmi", "qanday"),
+    "ru": ("привет", "здравствуйте", "как дела", "что нового", "как", "что"),
+    "en": ("hello", "hi", "how are you", "what's up", "what", "how"),
+}
+
+# Hissiyot belgilari
+FUNNY_INDICATORS = ("haha", "lol", "😂", "😄", "😜", "hazil", "шутка", "joke")
+SAD_INDICATORS = ("xafa", "yomon", "😢", "😔", "grustno", "sad", "tushkun", "huzur")
+# Uzun (10 so'zdan ko'p) xabarlarda xafalikni bildiruvchi qo'shimcha so'zlar
+SAD_LONG_INDICATORS = ("ko‘nglim", "yomon", "xafa", "grustno", "sad")
+
+# Naqsh turlari
+_LANGUAGE, _FUNNY, _SAD, _SAD_LONG, _CANNED = range(5)
+
+
+# Xabarni tahlil qilish natijasi. response - mos maxsus javob shabloni (yoki None),
+# wants_joke - javobga hazil qo'shilishi kerakmi ("{}" o'rni bor)
+class Match(NamedTuple):
+    language: str
+    emotion: str
+    key: str
+    response: str
+    wants_joke: bool
+    word_count: int
+
+
+# Aho-Corasick avtomati asosidagi ko'p naqshli moslashtiruvchi.
+# Maxsus javob kalitlari, til va hissiyot belgilari bitta avtomatga yig'iladi va xabar matni
+# bir marta o'qiladi. Shu o'tishda kirill/lotin harflari ham sanaladi.
+#
+# Ustuvorlik qoidalari (avvalgi detect_language/detect_emotion bilan bir xil):
+#   til: kirill harflari ko'p va rus so'zi bor -> ru; lotin harflari ko'p va ingliz so'zi bor -> en; aks holda uz
+#   hissiyot: kulgili belgi yoki (<= 5 so'z va "!") -> funny; xafa belgi yoki (> 10 so'z va qo'shimcha belgi) -> sad
+#   maxsus javob: aniqlangan til lug'atida birinchi (lug'at tartibida) uchragan kalit
+class Matcher:
+    def __init__(self, custom_responses: dict):
+        self._responses = custom_responses
+        self._keys = {language: list(responses) for language, responses in custom_responses.items()}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for language, words in LANGUAGE_WORDS.items():
+            for word in words:
+                self._add(word, (_LANGUAGE, language))
+        for word in FUNNY_INDICATORS:
+            self._add(word, (_FUNNY, None))
+        for word in SAD_INDICATORS:
+            self._add(word, (_SAD, None))
+        for word in SAD_LONG_INDICATORS:
+            self._add(word, (_SAD_LONG, None))
+        for language, keys in self._keys.items():
+            for index, key in enumerate(keys):
+                self._add(key, (_CANNED, (language, index)))
+        self._build_fail_links()
+        self._build_transitions()
+
+    # Naqshni trie'ga qo'shish
+    def _add(self, pattern: str, payload: tuple):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] += (payload,)
+
+    # Kenglik bo'yicha fail havolalarini qurish; har bir holat fail zanjiridagi natijalarni ham oladi
+    def _build_fail_links(self):
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] += self._out[self._fail[next_state]]
+                queue.append(next_state)
+
+    # Fail havolalarini oldindan yoyib, har bir holat uchun to'liq o'tish jadvalini tuzish:
+    # tahlil paytida har bir belgi uchun bitta lug'at murojaati yetadi
+    def _build_transitions(self):
+        delta = [dict(self._goto[0])] + [None] * (len(self._goto) - 1)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            delta[state] = {**delta[self._fail[state]], **self._goto[state]}
+            queue.extend(self._goto[state].values())
+        self._delta = delta
+
+    # Bitta xabarni tahlil qilish
+    def classify(self, message: str) -> Match:
+        text = message.lower().strip()
+        delta = self._delta
+        out = self._out
+        state = 0
+        cyrillic = latin = 0
+        hits = set()
+        for char in text:
+            if "a" <= char <= "z":
+                latin += 1
+            elif "а" <= char <= "я" or char == "ё":
+                cyrillic += 1
+            state = delta[state].get(char, 0)
+            if out[state]:
+                hits.update(out[state])
+        words = len(text.split())
+
+        if cyrillic > latin and (_LANGUAGE, "ru") in hits:
+            language = "ru"
+        elif latin > cyrillic and (_LANGUAGE, "en") in hits:
+            language = "en"
+        else:
+            language = "uz"
+
+        if (_FUNNY, None) in hits or (words <= 5 and "!" in text):
+            emotion = "funny"
+        elif (_SAD, None) in hits or (words > 10 and (_SAD_LONG, None) in hits):
+            emotion = "sad"
+        else:
+            emotion = "neutral"
+
+        canned = [value[1] for kind, value in hits if kind == _CANNED and value[0] == language]
+        if canned:
+            key = self._keys[language][min(canned)]
+            response = self._responses[language][key]
+            return Match(language, emotion, key, response, "{}" in response, words)
+        return Match(language, emotion, None, None, False, words)
+
+    # Ko'p xabarni birdaniga tahlil qilish (masalan, datasetni qayta belgilash uchun)
+    def classify_many(self, messages) -> list:
+        return [self.classify(message) for message in messages]
@@ -0,0 +1,254 @@
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Prometheus matn formatidagi metrikalar manzili (0 - o'chirilgan)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Shundan sekin so'rovlar bosqichlar bo'yicha logga yoziladi (millisoniya, 0 - o'chirilgan)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+# Gistogramma chegaralari (soniya)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# Yorliqli hisoblagich
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+# Yorliqli gistogramma: har bir yorliq to'plami uchun chegaralar bo'yicha sanoq, yig'indi va son
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # yorliqlar -> [chegaralar bo'yicha sanoqlar, yig'indi, son]
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+# Bitta so'rovning bosqichlar bo'yicha vaqtlari
+class RequestTimer:
+    def __init__(self, metrics, handler: str, user_id: int):
+        self.metrics = metrics
+        self.handler = handler
+        self.user_id = user_id
+        self.language = None
+        self.started = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages.append((name, elapsed))
+            self.metrics.stage_seconds.observe(elapsed, self.handler, name)
+
+    # So'rov yakuni: umumiy vaqt va natija (canned, cache_hit, generated, fallback, ...)
+    def finish(self, outcome: str):
+        total = time.perf_counter() - self.started
+        self.metrics.request_seconds.observe(total, self.handler, outcome)
+        self.metrics.startup.first_update_done()
+        slow = SLOW_REQUEST_MS and total * 1000 >= SLOW_REQUEST_MS
+        level = logging.WARNING if slow else logging.DEBUG
+        # Har bir so'rov DEBUG darajasida yoziladi; daraja o'chirilgan bo'lsa hech narsa yig'ilmaydi
+        if logger.isEnabledFor(level):
+            breakdown = ", ".join(f"{name}={elapsed * 1000:.1f}" for name, elapsed in self.stages)
+            logger.log(
+                level,
+                "%s: %s (%s) %.1f ms: %s",
+                "Sekin so'rov" if slow else "So'rov",
+                self.handler,
+                outcome,
+                total * 1000,
+                breakdown,
+                extra={
+                    "user_id": self.user_id,
+                    "language": self.language,
+                    "handler": self.handler,
+                    "outcome": outcome,
+                    "latency_ms": round(total * 1000, 1),
+                    "stages": {name: round(elapsed * 1000, 2) for name, elapsed in self.stages},
+                },
+            )
+
+
+# Ishga tushish bosqichlari: har bir nazorat nuqtasi oldingisidan beri o'tgan vaqtni yozadi,
+# shuning uchun bosqichlar yig'indisi jarayon boshidan birinchi qayta ishlangan yangilanishgacha bo'lgan vaqt
+class StartupTimer:
+    def __init__(self, started: float = None):
+        self.started = time.perf_counter() if started is None else started
+        self._last = self.started
+        self.stages = []
+        self.first_update = None
+
+    def checkpoint(self, name: str):
+        now = time.perf_counter()
+        self.stages.append((name, now - self._last))
+        self._last = now
+
+    # Birinchi so'rov tugaganda bir marta chaqiriladi: umumiy vaqt va bosqichlar logga yoziladi
+    def first_update_done(self):
+        if self.first_update is not None:
+            return
+        self.checkpoint("first_update")
+        self.first_update = self._last - self.started
+        breakdown = ", ".join(f"{name}={elapsed * 1000:.0f}" for name, elapsed in self.stages)
+        logger.info(
+            "Ishga tushish: birinchi yangilanishgacha %.2f s: %s",
+            self.first_update,
+            breakdown,
+            extra={
+                "stage": "startup",
+                "latency_ms": round(self.first_update * 1000, 1),
+                "stages": {name: round(elapsed * 1000, 1) for name, elapsed in self.stages},
+            },
+        )
+
+    def stats(self) -> dict:
+        return {
+            "seconds": {name: round(elapsed, 4) for name, elapsed in self.stages},
+            "first_update_seconds": round(self.first_update or 0, 4),
+        }
+
+
+# Bot metrikalari: bosqich va so'rov gistogrammalari, hisoblagichlar hamda komponentlarning stats()
+# qiymatlari (har so'rovda o'qiladigan o'lchagichlar)
+class Metrics:
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT, started: float = None):
+        self.host = host
+        self.port = port
+        self.stage_seconds = Histogram("airo_stage_seconds", "Handler bosqichlari davomiyligi", ("handler", "stage"))
+        self.request_seconds = Histogram("airo_request_seconds", "Handler umumiy davomiyligi", ("handler", "outcome"))
+        self.events = Counter("airo_events_total", "Hodisalar soni", ("event",))
+        self.tokens = Counter("airo_tokens_estimated_total", "Gemini tokenlari (taxminiy)", ("kind",))
+        self.startup = StartupTimer(started)
+        self._collectors = {}
+        self._server = None
+        self._loop = None
+
+    def timer(self, handler: str, user_id: int) -> RequestTimer:
+        return RequestTimer(self, handler, user_id)
+
+    # stats() lug'atini qaytaruvchi funksiyani ro'yxatga olish: sonli qiymatlari airo_<nom>_<kalit> bo'ladi
+    def add_collector(self, name: str, stats):
+        self._collectors[name] = stats
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.stage_seconds, self.request_seconds, self.events, self.tokens):
+            lines.extend(metric.render())
+        for name, stats in self._collectors.items():
+            for key, value in _flatten(stats()):
+                metric = f"airo_{name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    # HTTP serverni alohida oqimda ishga tushirish. Metrikalar event loop oqimida yig'iladi,
+    # shuning uchun handlerlar bilan poyga bo'lmaydi
+    def start_server(self):
+        if not self.port or self._server is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._server = ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="airo-metrics", daemon=True).start()
+        logger.info("Metrikalar: http://%s:%d/metrics", self.host, self.port)
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _render_threadsafe(self) -> str:
+        async def render():
+            return self.render()
+
+        return asyncio.run_coroutine_threadsafe(render(), self._loop).result(timeout=5)
+
+
+# Ichma-ich stats() lug'atini (kalit, son) juftliklariga yoyish
+def _flatten(stats: dict, prefix: str = ""):
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+def _handler_for(metrics: Metrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics._render_threadsafe().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
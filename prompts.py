@@ -0,0 +1,222 @@
+import re
+
+# Bot javob matnlari va Gemini prompt shablonlari.
+# Hammasi modul yuklanganda bir marta tayyorlanadi; xabar kelganda faqat tanlangan shablon to'ldiriladi.
+
+LANGUAGES = ("uz", "ru", "en")
+EMOTIONS = ("funny", "sad", "neutral")
+LENGTHS = ("short", "medium", "long")
+
+# Javob uzunligi bo'yicha Gemini token chegarasi
+MAX_TOKENS = {"short": 100, "medium": 200, "long": 400}
+
+# /start javobi
+START_RESPONSES = {
+    "uz": "Assalomu alaykum, {name}! 😊 Men AIRO, hazilkash va mehribon botman! Kayfiyating qanday, do'stim? 😎",
+    "ru": "Привет, {name}! 😊 Я AIRO, весёлый и добрый бот! Как настроение, кoresh? 😎",
+    "en": "Yo, {name}! 😊 I'm AIRO, a witty and kind bot! How's your vibe, mate? 😎",
+}
+
+# /help javobi
+HELP_RESPONSES = {
+    "uz": "Buyruqlar:\n/start - Botni yangidan boshlash\n/help - Shu yordam\n/joke - Zo'r hazil\n/history - Oldingi suhbatlar\nNima gaplashamiz, do'stim? 😜",
+    "ru": "Команды:\n/start - Перезапуск бота\n/help - Эта помощь\n/joke - Классная шутка\n/history - История чата\nЧё болтаем, кoresh? 😜",
+    "en": "Commands:\n/start - Restart the bot\n/help - This help\n/joke - Dope joke\n/history - Chat history\nWhat's up, mate? 😜",
+}
+
+# /joke javobi
+JOKE_RESPONSES = {
+    "uz": "Mana hazil: {joke} 😄 Yana nima gaplashamiz?",
+    "ru": "Держи шутку: {joke} 😄 Чё дальше?",
+    "en": "Here's a joke: {joke} 😄 What's next?",
+}
+
+# /history javoblari
+HISTORY_EMPTY_RESPONSES = {
+    "uz": "Hozircha suhbat tarixing yo'q, do'stim. 😊 Gaplashamizmi?",
+    "ru": "Пока нет истории чата, кoresh. 😊 Погнали болтать?",
+    "en": "No chat history yet, mate. 😊 Wanna chat?",
+}
+HISTORY_HEADERS = {
+    "uz": "Mana sening so'nggi suhbatlaring:\n",
+    "ru": "Вот твои последние чаты:\n",
+    "en": "Here's your recent chats:\n",
+}
+# /history sahifalari tugmalari: (eskiroq, yangiroq)
+HISTORY_BUTTONS = {
+    "uz": ("⬅️ Oldingi", "Keyingi ➡️"),
+    "ru": ("⬅️ Раньше", "Позже ➡️"),
+    "en": ("⬅️ Older", "Newer ➡️"),
+}
+
+# Hissiyotga mos ko'rsatma
+EMOTION_INSTRUCTIONS = {
+    "uz": {
+        "funny": "Javobni quvnoq, hazilkash va kulgili qil, smayliklar ishlat! 😜",
+        "sad": "Javobni mehribon, tasalli beruvchi va dalda beruvchi qil, foydalanuvchini ko'tar! 😊",
+        "neutral": "Javobni do'stona va hazilkash qil, tabiiy uslubda. 😎",
+    },
+    "ru": {
+        "funny": "Otvechay veselo, s yumorkom i prikolami, ispol'zuy smayliki! 😜",
+        "sad": "Otvechay dobrotno, uteshitel'no i podbadrivayushche, podnimi nastroeniye! 😊",
+        "neutral": "Otvechay po-druzheski i s yumorkom, v natural'nom stile. 😎",
+    },
+    "en": {
+        "funny": "Answer in a fun, witty, and humorous way, use emojis! 😜",
+        "sad": "Answer kindly, comfortingly, and encouragingly, cheer them up! 😊",
+        "neutral": "Answer in a friendly and humorous way, keep it natural. 😎",
+    },
+}
+
+# Javob uzunligi bo'yicha ko'rsatma
+LENGTH_INSTRUCTIONS = {
+    "uz": {
+        "short": "Javobni 1-2 jumlada ber.",
+        "medium": "Javobni 3-4 jumlada ber.",
+        "long": "Javobni 5-6 jumlada ber.",
+    },
+    "ru": {
+        "short": "Otvechay v 1-2 predlozheniyakh.",
+        "medium": "Otvechay v 3-4 predlozheniyakh.",
+        "long": "Otvechay v 5-6 predlozheniyakh.",
+    },
+    "en": {
+        "short": "Answer in 1-2 sentences.",
+        "medium": "Answer in 3-4 sentences.",
+        "long": "Answer in 5-6 sentences.",
+    },
+}
+
+# Gemini prompti: {emotion}, {emotion_instruction}, {length_instruction} oldindan to'ldiriladi,
+# {history} va {message} esa har bir xabar uchun qo'yiladi
+PROMPT_SOURCES = {
+    "uz": (
+        "Siz AIRO, o'zbek tilida ravon gaplashadigan, hazilkash va mehribon botsiz! 😊\n"
+        "Hech qachon 'salom', 'assalomu alaykum', 'привет', 'hello' kabi salomlashuv so'zlarini ishlatma, chunki suhbat allaqachon boshlangan.\n"
+        "Foydalanuvchi bilan do'stona suhbatlash, lekin 'ukam', 'do'stim', 'nima los?', 'zo'r-da!' kabi iboralarni faqat vaqti-vaqti bilan ishlat.\n"
+        "Foydalanuvchi xabarining hissiy ohangi: {emotion}. {emotion_instruction}\n"
+        "Suhbatni uzluksiz davom ettir, oldingi xabarlarni eslab qol va ularga tayan.\n"
+        "Agar savol noaniq bo'lsa, do'stona tarzda so'ra yoki hazil qil! 😜\n"
+        "Javobni oxirigacha to'liq yoz, chala qoldirma.\n"
+        "{length_instruction}\n"
+        "Oldingi suhbat (oxirgi xabarlar muhim):\n{history}\n"
+        "Foydalanuvchi xabari: {message}"
+    ),
+    "ru": (
+        "Ty AIRO, vesyolyy i dobrotnyy bot, boltayushchiy na russkom kak s koreshem! 😊\n"
+        "Nikogda ne ispol'zuy 'привет', 'здравствуйте', 'salom', 'hello' ili podobnyye privetstviya, potomu chto chat uzhe nachalsya.\n"
+        "Ispol'zuy frazy vrode 'bratan', 'koresh', 'chyo za dvizh?', 'puchkom!' tol'ko vremenami, chtoby ne pereborshchit'.\n"
+        "Ton soobshcheniya pol'zovatelya: {emotion}. {emotion_instruction}\n"
+        "Prodolzhay chat bez poteri konteksta, pomni proshlyye soobshcheniya i opiraysya na nikh.\n"
+        "Esli vopros mutnyy, utochni po-druzheski ili zashuti! 😜\n"
+        "Pishi otvet polnost'yu, ne obryvay.\n"
+        "{length_instruction}\n"
+        "Predydushchiy chat (posledniye soobshcheniya vazhny):\n{history}\n"
+        "Soobshcheniye pol'zovatelya: {message}"
+    ),
+    "en": (
+        "You're AIRO, a witty and kind bot chatting in English with an Uzbek vibe! 😊\n"
+        "Never use 'hello', 'hi', 'salom', 'привет' or any greetings, since the chat is already ongoing.\n"
+        "Use phrases like 'bro', 'mate', 'what's the deal?', 'that's dope!' sparingly to keep it natural.\n"
+        "User message tone: {emotion}. {emotion_instruction}\n"
+        "Keep the convo flowing, remember past messages, and build on them.\n"
+        "If the question's vague, ask for more in a friendly way or crack a joke! 😜\n"
+        "Write complete answers, don't cut off.\n"
+        "{length_instruction}\n"
+        "Previous chat (recent messages matter most):\n{history}\n"
+        "User message: {message}"
+    ),
+}
+
+# Javobdan olib tashlanadigan salomlashuvlar
+GREETING_PATTERNS = {
+    "uz": re.compile(r"\b(salom|assalomu alaykum)\b", re.IGNORECASE),
+    "ru": re.compile(r"\b(привет|здравствуйте)\b", re.IGNORECASE),
+    "en": re.compile(r"\b(hello|hi)\b", re.IGNORECASE),
+}
+
+# Javob tinish belgisi bilan tugamasa qo'shiladigan yakun
+REPLY_SUFFIXES = {
+    "uz": {
+        "funny": ". 😜 Yana nima gap, do'stim?",
+        "sad": ". 😊 Men sen bilanman, nima yordam beray?",
+        "neutral": ". 😄 Nima gaplashamiz?",
+    },
+    "ru": {
+        "funny": ". 😜 Chyo dal'she, koresh?",
+        "sad": ". 😊 Ya s toboy, chem pomoch'?",
+        "neutral": ". 😄 Chyo obsu dim?",
+    },
+    "en": {
+        "funny": ". 😜 What's next, mate?",
+        "sad": ". 😊 I'm here for you, what's up?",
+        "neutral": ". 😄 What's good?",
+    },
+}
+
+# Gemini xatosida yuboriladigan javob
+FALLBACK_RESPONSES = {
+    "uz": {
+        "funny": "Nimadir xato ketdi, lekin kayfiyatni buzmaymiz! 😜 Yana nima gap?",
+        "sad": "Nimadir xato ketdi, lekin tashvishlanma, do'stim! 😊 Men sen bilanman.",
+        "neutral": "Nimadir xato ketdi, do'stim! 😅 Lekin gaplashamiz, nima gap?",
+    },
+    "ru": {
+        "funny": "Chyo-to ne srabotalo, no nastroenie ne por tim! 😜 Chyo dal'she?",
+        "sad": "Chyo-to poshlo ne tak, no ne perezhivay, koresh! 😊 Ya s toboy.",
+        "neutral": "Chyo-to poshlo ne tak, koresh! 😅 No boltayem dal'she, chyo novogo?",
+    },
+    "en": {
+        "funny": "Something went wrong, but we keep the vibe high! 😜 What's next?",
+        "sad": "Something went wrong, but don't worry, mate! 😊 I'm here for you.",
+        "neutral": "Something went wrong, mate! 😅 But we keep chattin', what's good?",
+    },
+}
+
+
+# Oldindan tayyorlangan prompt: o'zgarmas qismlar orasiga tarix va xabar qo'yiladi
+class PromptTemplate:
+    __slots__ = ("head", "middle")
+
+    def __init__(self, head: str, middle: str):
+        self.head = head
+        self.middle = middle
+
+    def render(self, history: str, message: str) -> str:
+        return f"{self.head}{history}{self.middle}{message}"
+
+
+# Barcha (til, hissiyot, uzunlik) uchun shablonlarni tayyorlash
+def _compile_prompts() -> dict:
+    templates = {}
+    for language in LANGUAGES:
+        for emotion in EMOTIONS:
+            for length in LENGTHS:
+                static = PROMPT_SOURCES[language].replace("{emotion}", emotion).replace(
+                    "{emotion_instruction}", EMOTION_INSTRUCTIONS[language][emotion]
+                ).replace("{length_instruction}", LENGTH_INSTRUCTIONS[language][length])
+                head, rest = static.split("{history}")
+                middle = rest.split("{message}")[0]
+                templates[(language, emotion, length)] = PromptTemplate(head, middle)
+    return templates
+
+
+PROMPTS = _compile_prompts()
+
+
+# Tanlangan shablon bo'yicha Gemini promptini yig'ish
+def render_prompt(language: str, emotion: str, length: str, history: str, message: str) -> str:
+    return PROMPTS[(language, emotion, length)].render(history, message)
+
+
+# Javobdan salomlashuv so'zlarini olib tashlash (oqimdagi oraliq matnlar uchun ham ishlatiladi)
+def strip_greetings(text: str, language: str) -> str:
+    return GREETING_PATTERNS[language].sub("", text.strip()).strip()
+
+
+# Gemini javobini yakuniy ko'rinishga keltirish: salomlashuvni olib tashlash va yakun qo'shish
+def finalize_reply(text: str, language: str, emotion: str) -> str:
+    text = strip_greetings(text, language)
+    if not text.endswith((".", "!", "?")):
+        text += REPLY_SUFFIXES[language][emotion]
+    return text
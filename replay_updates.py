@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from export import iter_dataset
+
+# Yozib olingan Telegram yangilanishlarini webhook rejimidagi botning ichki HTTP serveriga yuborish.
+# Botni BOT_MODE=webhook bilan ishga tushirib, mahalliy sinov uchun ishlatiladi:
+#   python replay_updates.py updates.jsonl --url http://127.0.0.1:8443/telegram
+#   python replay_updates.py --dataset airo_dataset.json --limit 200 --concurrency 16
+
+
+# Fayldan yangilanishlarni o'qish: JSON ro'yxat yoki har qatorda bitta JSON (JSONL)
+def load_updates(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+# export.py datasetidan (JSONL yoki eski JSON ro'yxat) soxta matnli yangilanishlar yasash
+def updates_from_dataset(path: str) -> list:
+    updates = []
+    for index, row in enumerate(iter_dataset(path), start=1):
+        user = {"id": row["user_id"], "is_bot": False, "first_name": "Replay"}
+        updates.append({
+            "update_id": index,
+            "message": {
+                "message_id": index,
+                "date": int(time.time()),
+                "chat": {"id": row["user_id"], "type": "private"},
+                "from": user,
+                "text": row["prompt"],
+            },
+        })
+    return updates
+
+
+def post_update(url: str, secret: str, update: dict) -> tuple:
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+    request = urllib.request.Request(url, data=json.dumps(update).encode(), headers=headers, method="POST")
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yozib olingan yangilanishlarni webhook serveriga yuborish")
+    parser.add_argument("updates", nargs="?", help="yangilanishlar fayli (JSON ro'yxat yoki JSONL)")
+    parser.add_argument("--dataset", help="yangilanishlarni export.py datasetidan yasash (.json, .jsonl, .jsonl.gz, ...)")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{os.getenv('WEBHOOK_PORT', '8443')}/{os.getenv('WEBHOOK_PATH', 'telegram')}")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET"))
+    parser.add_argument("--concurrency", type=int, default=1, help="bir vaqtda yuboriladigan so'rovlar soni (foydalanuvchi xabarlari tartibi faqat 1 da saqlanadi)")
+    parser.add_argument("--limit", type=int, help="faqat birinchi N ta yangilanish")
+    args = parser.parse_args()
+    if bool(args.updates) == bool(args.dataset):
+        parser.error("yangilanishlar fayli yoki --dataset dan bittasini bering")
+
+    updates = load_updates(args.updates) if args.updates else updates_from_dataset(args.dataset)
+    updates = updates[:args.limit]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda update: post_update(args.url, args.secret, update), updates))
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+    print(json.dumps({
+        "updates": len(results),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(results) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
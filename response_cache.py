@@ -0,0 +1,98 @@
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+
+# Qaysi uzunlikdagi savollar keshlanadi (uzun, kontekstga bog'liq javoblar hech qachon qayta ishlatilmaydi)
+RESPONSE_CACHE_LENGTHS = set(filter(None, os.getenv("RESPONSE_CACHE_LENGTHS", "short").split(",")))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Kalitga qo'shiladigan so'nggi suhbatlar soni (suhbat tarixi izi)
+RESPONSE_CACHE_HISTORY_TURNS = int(os.getenv("RESPONSE_CACHE_HISTORY_TURNS", "1"))
+# Doimiy qism: kesh SQLite'da ham saqlanadi va qayta ishga tushirishdan keyin ham ishlaydi
+RESPONSE_CACHE_PERSIST = os.getenv("RESPONSE_CACHE_PERSIST", "0") == "1"
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+# Xabarni kalit uchun normallashtirish: kichik harf, tinish belgilarisiz, bitta probel
+def normalize_message(message: str) -> str:
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", message.lower())).strip()
+
+
+# Takroriy savollarga Gemini javoblari keshi: xotirada LRU + TTL, ixtiyoriy SQLite qismi bilan
+class ResponseCache:
+    def __init__(self, storage=None, lengths=RESPONSE_CACHE_LENGTHS, max_entries: int = RESPONSE_CACHE_SIZE,
+                 ttl: int = RESPONSE_CACHE_TTL, persist: bool = RESPONSE_CACHE_PERSIST):
+        self.storage = storage if persist else None
+        self.lengths = lengths
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # kalit -> (javob, amal qilish muddati, javobni yaratishga ketgan vaqt)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.saved_latency = 0.0
+
+    def enabled_for(self, message_length: str) -> bool:
+        return message_length in self.lengths
+
+    # Kesh kaliti: normallashtirilgan xabar, til, hissiyot, uzunlik va so'nggi suhbatlar izi
+    def key(self, message: str, language: str, emotion: str, message_length: str, chat_history: list) -> str:
+        digest = hashlib.sha1()
+        for part in (normalize_message(message), language, emotion, message_length):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        for row in chat_history[:RESPONSE_CACHE_HISTORY_TURNS]:
+            digest.update(row[0].encode())
+            digest.update(b"\0")
+            digest.update(row[1].encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def get(self, key: str):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_latency += entry[2]
+                return entry[0]
+            del self._entries[key]
+        if self.storage is not None:
+            row = await self.storage.get_cached_response(key, int(now) - self.ttl)
+            if row is not None:
+                self._remember(key, row[0], row[1], row[2] + self.ttl)
+                self.hits += 1
+                self.persistent_hits += 1
+                self.saved_latency += row[1]
+                return row[0]
+        self.misses += 1
+        return None
+
+    # latency: javobni yaratishga ketgan vaqt (keshdan olinganda tejalgan vaqt sifatida hisoblanadi)
+    async def put(self, key: str, response: str, latency: float):
+        self._remember(key, response, latency, time.time() + self.ttl)
+        if self.storage is not None:
+            await self.storage.save_cached_response(key, response, latency)
+
+    def _remember(self, key: str, response: str, latency: float, expires: float):
+        self._entries[key] = (response, expires, latency)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "saved_latency_s": round(self.saved_latency, 2),
+            "entries": len(self._entries),
+        }
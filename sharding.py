@@ -0,0 +1,167 @@
+import argparse
+import bisect
+import glob
+import hashlib
+import logging
+import os
+import sqlite3
+
+from storage import DB_PATH, Storage, query_history_page
+
+logger = logging.getLogger(__name__)
+
+# Ishchi jarayonlar (shardlar) soni; 1 bo'lsa bot bitta jarayonda DB_PATH bilan ishlaydi
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+# Har bir shard bazasining fayl nomi shabloni
+SHARD_DB_TEMPLATE = os.getenv("SHARD_DB_TEMPLATE", "chat_history.shard{shard}.db")
+# Halqadagi har bir shard uchun virtual nuqtalar soni (ko'p bo'lsa taqsimot tekisroq)
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+# SQLite rowid'ining eng katta qiymati
+MAX_ROWID = 2**63 - 1
+
+# Shardlar orasida ko'chiriladigan jadvallar va ustunlar (response_cache foydalanuvchiga bog'liq emas)
+SHARD_TABLES = {
+    "chat_history": ("user_id", "message", "response", "timestamp", "language", "emotion", "ts"),
+    "user_profiles": ("user_id", "language"),
+    "user_summaries": ("user_id", "summary", "covered_ts", "updated_ts"),
+}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+# Izchil xeshlash halqasi: shardlar soni o'zgarganda foydalanuvchilarning faqat kichik qismi
+# boshqa shardga o'tadi (N -> N+1 da taxminan 1/(N+1) qismi)
+class HashRing:
+    def __init__(self, shards: int, vnodes: int = SHARD_VNODES):
+        points = sorted((_hash(f"shard-{shard}#{vnode}"), shard) for shard in range(shards) for vnode in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, user_id: int) -> int:
+        index = bisect.bisect(self._points, _hash(str(user_id))) % len(self._points)
+        return self._shards[index]
+
+
+# Shardlar soni bo'yicha baza fayllari (1 ta shard - odatdagi DB_PATH)
+def shard_paths(count: int = SHARD_COUNT) -> list:
+    if count <= 1:
+        return [DB_PATH]
+    return [SHARD_DB_TEMPLATE.format(shard=shard) for shard in range(count)]
+
+
+# Diskdagi barcha suhbat bazalari: joriy va avvalgi shardlar hamda bitta jarayonli rejim fayli
+def all_db_paths() -> list:
+    paths = [DB_PATH] + sorted(glob.glob(SHARD_DB_TEMPLATE.format(shard="*")))
+    return [path for path in paths if os.path.exists(path)]
+
+
+# /history sahifa kaliti (ts, db, rowid): db - bazaning ro'yxatdagi tartib raqami, chunki rowid faqat
+# bitta baza ichida tartiblaydi. Kalitni db bazasi uchun (ts, rowid) chegarasiga aylantirish:
+# teng ts'li qatorlar kichik raqamli bazadan oldin keladi
+def history_bound(key: tuple, db: int, older: bool) -> tuple:
+    ts, key_db, rowid = key
+    if db == key_db:
+        return ts, rowid
+    # Teng ts'li qatorlarning hammasi (True) yoki hech biri (False) chegaradan o'tadi
+    include = db < key_db if older else db > key_db
+    return ts, MAX_ROWID if include == older else -1
+
+
+# Bir nechta bazadan /history sahifasini o'qish (faqat o'qish uchun ochiladi). Shardlar soni o'zgargach,
+# ko'chirilmagan eski yozuvlar ham shu yo'l bilan ko'rinadi. Natija: (ts, db, rowid, message, response,
+# language, emotion), db - first_db dan boshlab paths dagi tartib raqami; tartiblash chaqiruvchida
+def read_history_page(paths: list, user_id: int, older: bool, key: tuple, limit: int, first_db: int = 1) -> list:
+    rows = []
+    for db, path in enumerate(paths, first_db):
+        ts, rowid = history_bound(key, db, older)
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows.extend((row[0], db) + row[1:] for row in query_history_page(conn, user_id, older, ts, rowid, limit))
+        except sqlite3.OperationalError as e:
+            # Hali migratsiya qilinmagan yoki bo'sh fayl
+            logger.warning("%s bazasidan tarix o'qilmadi: %s", path, e)
+        finally:
+            conn.close()
+    return rows
+
+
+# Foydalanuvchilarni yangi shardlar soniga ko'chirish (bot to'xtatilgan holda ishga tushiriladi).
+# Har bir (manba, nishon) juftligi bitta tranzaksiyada ko'chiriladi. SQLite bir nechta bazaga yozuvchi
+# tranzaksiyani WAL rejimida atomar qilmaydi (har bir fayl alohida commit bo'ladi), shuning uchun
+# ko'chirish vaqtida ikkala fayl ham oddiy jurnal (journal_mode=DELETE) rejimiga o'tkaziladi va
+# keyin WAL qaytariladi. Shunda to'xtab qolsa qayta ishga tushirish xavfsiz.
+# Natija: {manba: {nishon: foydalanuvchilar soni}}
+def rebalance(old_count: int, new_count: int) -> dict:
+    ring = HashRing(new_count)
+    targets = shard_paths(new_count)
+    for path in targets:
+        storage = Storage(path)
+        storage.init_db()
+        storage.close()
+
+    moved = {}
+    for source in shard_paths(old_count):
+        if not os.path.exists(source):
+            continue
+        storage = Storage(source)
+        storage.init_db()
+        storage.close()
+        conn = sqlite3.connect(source)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        try:
+            user_ids = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT user_id FROM chat_history UNION SELECT user_id FROM user_profiles "
+                    "UNION SELECT user_id FROM user_summaries"
+                )
+            ]
+            by_target = {}
+            for user_id in user_ids:
+                target = targets[ring.shard_for(user_id)]
+                if os.path.abspath(target) != os.path.abspath(source):
+                    by_target.setdefault(target, []).append(user_id)
+            for target, users in by_target.items():
+                _move_users(conn, target, users)
+                logger.info("Rebalans: %s -> %s, %d foydalanuvchi", source, target, len(users))
+            moved[source] = {target: len(users) for target, users in by_target.items()}
+        finally:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.close()
+    return moved
+
+
+def _move_users(conn: sqlite3.Connection, target: str, users: list):
+    conn.execute("ATTACH DATABASE ? AS target", (target,))
+    conn.execute("PRAGMA target.journal_mode=DELETE")
+    try:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS moving (user_id INTEGER PRIMARY KEY)")
+        with conn:
+            conn.execute("DELETE FROM moving")
+            conn.executemany("INSERT INTO moving (user_id) VALUES (?)", [(user_id,) for user_id in users])
+            for table, columns in SHARD_TABLES.items():
+                column_list = ", ".join(columns)
+                verb = "INSERT" if table == "chat_history" else "INSERT OR REPLACE"
+                conn.execute(
+                    f"{verb} INTO target.{table} ({column_list}) SELECT {column_list} FROM main.{table} "
+                    f"WHERE user_id IN (SELECT user_id FROM moving) ORDER BY rowid"
+                )
+                conn.execute(f"DELETE FROM main.{table} WHERE user_id IN (SELECT user_id FROM moving)")
+    finally:
+        conn.execute("PRAGMA target.journal_mode=WAL")
+        conn.execute("DETACH DATABASE target")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Foydalanuvchilarni shardlar orasida qayta taqsimlash")
+    parser.add_argument("--from", dest="old_count", type=int, required=True, help="avvalgi shardlar soni")
+    parser.add_argument("--to", dest="new_count", type=int, default=SHARD_COUNT, help="yangi shardlar soni (SHARD_COUNT)")
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    print(rebalance(args.old_count, args.new_count))
+
+
+if __name__ == "__main__":
+    main()
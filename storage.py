@@ -0,0 +1,479 @@
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from history_cache import HistoryCache
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("DB_PATH", "chat_history.db")
+# Migratsiya paytida eski yozuvlar shu o'lchamdagi bo'laklarda yangilanadi
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+
+# Saqlash muddati: jadval -> (epoch vaqt ustuni, necha soat saqlanadi). RETENTION_<JADVAL>_HOURS bilan sozlanadi
+RETENTION = {
+    "chat_history": ("ts", int(os.getenv("RETENTION_CHAT_HISTORY_HOURS", "48"))),
+    "user_summaries": ("updated_ts", int(os.getenv("RETENTION_USER_SUMMARIES_HOURS", "48"))),
+    "response_cache": ("created_ts", int(os.getenv("RETENTION_RESPONSE_CACHE_HOURS", "24"))),
+}
+# Bitta tranzaksiyada o'chiriladigan qatorlar soni va bir ishga tushishdagi bo'laklar chegarasi
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_MAX_BATCHES = int(os.getenv("RETENTION_MAX_BATCHES", "200"))
+# Har bir tozalashdan keyin OS'ga qaytariladigan bo'sh sahifalar chegarasi
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))
+
+# Navbatdagi xabarlar shu songa yetganda darhol yoziladi (aks holda davriy flush kutiladi)
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "100"))
+# Xotirada saqlanadigan profil tillari soni (LRU; yozilmagan profillar chiqarilmaydi)
+PROFILE_CACHE_USERS = int(os.getenv("PROFILE_CACHE_USERS", "10000"))
+
+# Ulanish uchun PRAGMA sozlamalari: WAL rejimi o'qish va yozishni bir-biriga to'sqinlik qilmaydigan qiladi.
+# auto_vacuum faqat yangi (bo'sh) faylda kuchga kiradi, shuning uchun journal_mode'dan oldin turadi
+PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA busy_timeout=5000",
+)
+
+# SQL so'rovlari o'zgarmas matn sifatida saqlanadi, sqlite3 ularni ulanish ichida tayyorlangan holda keshlaydi
+SQL_SAVE_USER_PROFILE = "INSERT OR REPLACE INTO user_profiles (user_id, language) VALUES (?, ?)"
+SQL_GET_USER_PROFILE = "SELECT language FROM user_profiles WHERE user_id = ?"
+SQL_SAVE_MESSAGE = (
+    "INSERT INTO chat_history (user_id, message, response, timestamp, language, emotion, ts) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+# (user_id, ts) indeksi bo'yicha o'qiladi; bir xil soniyadagi yozuvlar rowid tartibida qoladi
+SQL_GET_CHAT_HISTORY = (
+    "SELECT message, response, language, emotion, ts FROM chat_history "
+    "WHERE user_id = ? AND ts >= ? ORDER BY ts DESC, rowid DESC LIMIT ?"
+)
+
+# /history sahifalari: (ts, rowid) bo'yicha keyset, idx_chat_history_user_ts indeksi bo'ylab o'qiladi
+SQL_GET_HISTORY_BEFORE = (
+    "SELECT ts, rowid, message, response, language, emotion FROM chat_history "
+    "WHERE user_id = ? AND ts <= ? AND (ts < ? OR rowid < ?) ORDER BY ts DESC, rowid DESC LIMIT ?"
+)
+SQL_GET_HISTORY_AFTER = (
+    "SELECT ts, rowid, message, response, language, emotion FROM chat_history "
+    "WHERE user_id = ? AND ts >= ? AND (ts > ? OR rowid > ?) ORDER BY ts, rowid LIMIT ?"
+)
+
+SQL_GET_SUMMARY = "SELECT summary, covered_ts FROM user_summaries WHERE user_id = ?"
+SQL_SAVE_SUMMARY = (
+    "INSERT OR REPLACE INTO user_summaries (user_id, summary, covered_ts, updated_ts) VALUES (?, ?, ?, ?)"
+)
+SQL_GET_CACHED_RESPONSE = "SELECT response, latency, created_ts FROM response_cache WHERE key = ? AND created_ts >= ?"
+SQL_SAVE_CACHED_RESPONSE = (
+    "INSERT OR REPLACE INTO response_cache (key, response, latency, created_ts) VALUES (?, ?, ?, ?)"
+)
+
+
+# 1-migratsiya: asosiy jadvallar (eski init_db dagi ALTER TABLE tekshiruvlari bilan)
+def _migration_base_schema(conn: sqlite3.Connection):
+    with conn:
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS chat_history
+                     (user_id INTEGER, message TEXT, response TEXT, timestamp TEXT, language TEXT, emotion TEXT)"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS user_profiles
+                     (user_id INTEGER PRIMARY KEY, language TEXT)"""
+        )
+        columns = [info[1] for info in conn.execute("PRAGMA table_info(chat_history)")]
+        if "language" not in columns:
+            conn.execute("ALTER TABLE chat_history ADD COLUMN language TEXT DEFAULT 'uz'")
+        if "emotion" not in columns:
+            conn.execute("ALTER TABLE chat_history ADD COLUMN emotion TEXT DEFAULT 'neutral'")
+
+# 2-migratsiya: butun sonli epoch vaqt ustuni (ts) va (user_id, ts) indeksi.
+# ALTER TABLE ADD COLUMN jadvalni qayta yozmaydi; eski qatorlarning ts qiymati migratsiyada emas,
+# bot ishlayotganda fonda to'ldiriladi (Storage.backfill_timestamps)
+def _migration_epoch_timestamps(conn: sqlite3.Connection):
+    with conn:
+        columns = [info[1] for info in conn.execute("PRAGMA table_info(chat_history)")]
+        if "ts" not in columns:
+            conn.execute("ALTER TABLE chat_history ADD COLUMN ts INTEGER")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_user_ts ON chat_history (user_id, ts)")
+
+
+# ts ustuni bo'sh qolgan qatorlarning bitta bo'lagini to'ldirish; to'ldirilgan qatorlar sonini qaytaradi.
+# Eski matnli vaqt mahalliy vaqtda yozilgan, 'utc' modifikatori uni to'g'ri epoch'ga o'giradi.
+# Vaqti o'qilmaydigan qatorlarga 0 yoziladi (aks holda ular hech qachon to'ldirilmaydi va
+# tarix, tozalash va eksportdan chetda qoladi); bunday qatorlar birinchi tozalashda o'chadi
+def backfill_timestamps_batch(conn: sqlite3.Connection, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    with conn:
+        cursor = conn.execute(
+            "UPDATE chat_history SET ts = COALESCE(CAST(strftime('%s', timestamp, 'utc') AS INTEGER), 0) "
+            "WHERE rowid IN (SELECT rowid FROM chat_history WHERE ts IS NULL LIMIT ?)",
+            (batch_size,),
+        )
+    return cursor.rowcount
+
+
+# 3-migratsiya: saqlash muddati bo'yicha tozalash uchun ts indeksi.
+# Mavjud faylda auto_vacuum=INCREMENTAL faqat to'liq VACUUM'dan keyin kuchga kiradi. U butun bazani
+# qayta yozadi va ikki baravar joy talab qiladi, shuning uchun ishga tushishda emas, bot to'xtatilgan
+# holda alohida bajariladi: python storage.py --vacuum
+def _migration_retention(conn: sqlite3.Connection):
+    with conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_ts ON chat_history (ts)")
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logger.warning(
+            "auto_vacuum=INCREMENTAL yoqilmagan: tozalashdan keyin bo'sh sahifalar OS'ga qaytarilmaydi. "
+            "Bot to'xtatilgan holda 'python storage.py --vacuum' ni ishga tushiring"
+        )
+
+
+# 4-migratsiya: har bir foydalanuvchi uchun eski suhbatlarning jamlangan xulosasi
+def _migration_user_summaries(conn: sqlite3.Connection):
+    with conn:
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS user_summaries
+                     (user_id INTEGER PRIMARY KEY, summary TEXT, covered_ts INTEGER, updated_ts INTEGER)"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_user_summaries_updated ON user_summaries (updated_ts)")
+
+
+# 5-migratsiya: takroriy savollarga javoblar keshining doimiy qismi
+def _migration_response_cache(conn: sqlite3.Connection):
+    with conn:
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS response_cache
+                     (key TEXT PRIMARY KEY, response TEXT, latency REAL, created_ts INTEGER)"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache (created_ts)")
+
+
+# Migratsiyalar ro'yxati: i-element sxemani i+1 versiyaga o'tkazadi (PRAGMA user_version)
+MIGRATIONS = (
+    _migration_base_schema,
+    _migration_epoch_timestamps,
+    _migration_retention,
+    _migration_user_summaries,
+    _migration_response_cache,
+)
+
+
+# Ma'lumotlar bazasini eng so'nggi sxema versiyasiga o'tkazish
+def migrate(conn: sqlite3.Connection):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info("Sxema migratsiyasi %d: %s", number, migration.__name__)
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+
+
+# (ts, rowid) dan oldingi (older=True, yangidan eskiga) yoki keyingi (eskidan yangiga) yozuvlar:
+# (ts, rowid, message, response, language, emotion)
+def query_history_page(conn: sqlite3.Connection, user_id: int, older: bool, ts: int, rowid: int, limit: int) -> list:
+    sql = SQL_GET_HISTORY_BEFORE if older else SQL_GET_HISTORY_AFTER
+    return conn.execute(sql, (user_id, ts, ts, rowid, limit)).fetchall()
+
+
+# Ma'lumotlar bazasi bilan ishlovchi qatlam: bitta doimiy ulanish va unga xizmat qiluvchi alohida oqim
+class Storage:
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._conn = None
+        self._closed = False
+        # Yozishni kechiktirish navbati: yozilmagan xabar qatorlari va o'zgargan profillar
+        self._pending_messages = []
+        self._pending_cache = []
+        self._dirty_profiles = {}
+        # Bazadagi (yoki navbatdagi) profil tillari, LRU tartibida; o'zgarmagan profil qayta yozilmaydi
+        self._profiles = OrderedDict()
+        # So'nggi suhbatlar keshi: barqaror holatda suhbat tarixi bazadan o'qilmaydi
+        self.history = HistoryCache()
+        # Barcha so'rovlar shu bitta oqimda bajariladi, shuning uchun ulanishga qulf kerak emas
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="airo-db")
+
+    # Ulanishni ochish (faqat DB oqimida chaqiriladi)
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=128)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    # Funksiyani DB oqimida bajarib, natijani event loop'ni bloklamasdan kutish
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # Funksiyani DB oqimida bajarib, natijani sinxron kutish (event loop tashqarisida)
+    def _run_sync(self, func, *args):
+        return self._executor.submit(func, *args).result()
+
+    # Navbatdagi profillar va xabarlarni bitta tranzaksiyada yozish
+    def _write_batch(self, profiles: list, messages: list, cached: list):
+        conn = self._connection()
+        with conn:
+            if profiles:
+                conn.executemany(SQL_SAVE_USER_PROFILE, profiles)
+            if messages:
+                conn.executemany(SQL_SAVE_MESSAGE, messages)
+            if cached:
+                conn.executemany(SQL_SAVE_CACHED_RESPONSE, cached)
+
+    def _get_user_profile(self, user_id: int):
+        result = self._connection().execute(SQL_GET_USER_PROFILE, (user_id,)).fetchone()
+        return result[0] if result else None
+
+    def _get_chat_history(self, user_id: int, time_threshold: int, max_messages: int):
+        return self._connection().execute(
+            SQL_GET_CHAT_HISTORY, (user_id, time_threshold, max_messages)
+        ).fetchall()
+
+    def _get_history_page(self, user_id: int, older: bool, ts: int, rowid: int, limit: int):
+        return query_history_page(self._connection(), user_id, older, ts, rowid, limit)
+
+    def _backfill_timestamps_batch(self, batch_size: int) -> int:
+        return backfill_timestamps_batch(self._connection(), batch_size)
+
+    def _get_cached_response(self, key: str, min_created_ts: int):
+        return self._connection().execute(SQL_GET_CACHED_RESPONSE, (key, min_created_ts)).fetchone()
+
+    def _get_summary(self, user_id: int):
+        return self._connection().execute(SQL_GET_SUMMARY, (user_id,)).fetchone()
+
+    def _save_summary(self, user_id: int, summary: str, covered_ts: int):
+        conn = self._connection()
+        with conn:
+            conn.execute(SQL_SAVE_SUMMARY, (user_id, summary, covered_ts, int(time.time())))
+
+    # Muddati o'tgan qatorlarning bitta bo'lagini o'chirish; o'chirilgan qatorlar sonini qaytaradi
+    def _delete_expired_batch(self, table: str, column: str, cutoff: int, batch_size: int) -> int:
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?)",
+                (cutoff, batch_size),
+            )
+        return cursor.rowcount
+
+    def _file_size(self) -> int:
+        return database_size(self._connection())
+
+    # Bo'sh sahifalarni OS'ga qaytarish va WAL'ni asosiy faylga ko'chirish (o'quvchilarni to'xtatmaydi)
+    def _reclaim_space(self, max_pages: int) -> int:
+        conn = self._connection()
+        size_before = self._file_size()
+        conn.execute(f"PRAGMA incremental_vacuum({max_pages})").fetchall()
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        return size_before - self._file_size()
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # Ulanishni ochib, migratsiyalarni bajarish (main() ichida, event loop ishga tushishidan oldin)
+    def init_db(self):
+        self._run_sync(self._connection)
+
+    # Navbatni bo'shatib olish (yozish DB oqimiga topshirilguncha event loop'dan chiqilmaydi,
+    # shuning uchun keyingi o'qishlar bu yozuvlarni albatta ko'radi)
+    def _take_pending(self):
+        batch = (list(self._dirty_profiles.items()), self._pending_messages, self._pending_cache)
+        self._dirty_profiles = {}
+        self._pending_messages = []
+        self._pending_cache = []
+        return batch
+
+    # Yozilmay qolgan navbatni qaytarish (keyingi flush'da qayta urinadi)
+    def _restore_pending(self, profiles: list, messages: list, cached: list):
+        for user_id, language in profiles:
+            self._dirty_profiles.setdefault(user_id, language)
+        self._pending_messages = messages + self._pending_messages
+        self._pending_cache = cached + self._pending_cache
+
+    # Profil tilini keshda yangilash va eng uzoq ishlatilmaganlarini chiqarish. Hali yozilmagan profillar
+    # qoladi: ular chiqarilsa, get_user_profile bazadagi eski tilni o'qib qo'yadi
+    def _remember_profile(self, user_id: int, language: str):
+        self._profiles[user_id] = language
+        self._profiles.move_to_end(user_id)
+        excess = len(self._profiles) - PROFILE_CACHE_USERS
+        if excess <= 0:
+            return
+        oldest = islice(self._profiles, excess + len(self._dirty_profiles))
+        for old_user in [user for user in oldest if user not in self._dirty_profiles][:excess]:
+            del self._profiles[old_user]
+
+    # Foydalanuvchi profilini saqlash: til o'zgarmagan bo'lsa hech narsa yozilmaydi
+    async def save_user_profile(self, user_id: int, language: str):
+        if self._profiles.get(user_id) == language:
+            self._profiles.move_to_end(user_id)
+            return
+        self._dirty_profiles[user_id] = language
+        self._remember_profile(user_id, language)
+
+    # Foydalanuvchi profilini olish
+    async def get_user_profile(self, user_id: int) -> str:
+        language = self._profiles.get(user_id)
+        if language is not None:
+            self._profiles.move_to_end(user_id)
+            return language
+        language = await self._run(self._get_user_profile, user_id)
+        if language is None:
+            return "uz"
+        # O'qish paytida saqlangan yangi til ustun
+        language = self._profiles.get(user_id, language)
+        self._remember_profile(user_id, language)
+        return language
+
+    # Suhbat tarixini saqlash: qator navbatga qo'shiladi, partiya to'lganda yoziladi
+    async def save_message(self, user_id: int, message: str, response: str, language: str, emotion: str):
+        now = time.time()
+        timestamp = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        self._pending_messages.append((user_id, message, response, timestamp, language, emotion, int(now)))
+        self.history.append(user_id, (message, response, language, emotion, int(now)))
+        if len(self._pending_messages) >= WRITE_BATCH_SIZE:
+            await self.flush()
+
+    # Navbatni bazaga yozish (JobQueue orqali davriy ham chaqiriladi)
+    async def flush(self):
+        if not self._pending_messages and not self._dirty_profiles and not self._pending_cache:
+            return
+        batch = self._take_pending()
+        try:
+            await self._run(self._write_batch, *batch)
+        except Exception:
+            self._restore_pending(*batch)
+            raise
+
+    # Suhbat tarixini olish (yangidan eskiga, (message, response, language, emotion, ts)): avval keshdan, bo'lmasa bazadan o'qib keshni to'ldiradi.
+    # Bazadan o'qilganda hali yozilmagan navbatdagi xabarlar ham qo'shiladi
+    async def get_chat_history(self, user_id: int, time_limit_hours: int = 12, max_messages: int = 100):
+        time_threshold = int(time.time()) - time_limit_hours * 3600
+        rows = self.history.get(user_id, time_threshold, max_messages)
+        if rows is None:
+            self.history.start_warm(user_id)
+            pending = [
+                (row[1], row[2], row[4], row[5], row[6])
+                for row in reversed(self._pending_messages)
+                if row[0] == user_id and row[6] >= time_threshold
+            ]
+            try:
+                stored = await self._run(self._get_chat_history, user_id, time_threshold, self.history.turns)
+            except BaseException:
+                # Xato yoki bekor qilish (coalescer eskirgan partiyani bekor qiladi): yuklash paytida
+                # qo'shilgan yozuvlar tashlanadi, aks holda keyingi yuklashda ular ikki marta chiqadi
+                self.history.cancel_warm(user_id)
+                raise
+            rows = (pending + stored)[: self.history.turns]
+            self.history.finish_warm(user_id, rows, time_threshold)
+        return rows[:max_messages]
+
+    # /history sahifasi uchun bazadagi yozuvlar (query_history_page). Navbatdagi xabarlar
+    # ko'rinishi uchun avval flush() chaqiriladi
+    async def get_history_page(self, user_id: int, older: bool, ts: int, rowid: int, limit: int) -> list:
+        return await self._run(self._get_history_page, user_id, older, ts, rowid, limit)
+
+    # Keshlangan javobni olish: (response, latency, created_ts) yoki None
+    async def get_cached_response(self, key: str, min_created_ts: int):
+        return await self._run(self._get_cached_response, key, min_created_ts)
+
+    # Keshlangan javobni saqlash (navbat orqali, boshqa yozuvlar bilan bitta tranzaksiyada)
+    async def save_cached_response(self, key: str, response: str, latency: float):
+        self._pending_cache.append((key, response, latency, int(time.time())))
+
+    # Suhbat xulosasini olish: (summary, covered_ts) yoki None
+    async def get_summary(self, user_id: int):
+        return await self._run(self._get_summary, user_id)
+
+    # Suhbat xulosasini saqlash (kamdan-kam yoziladi, shuning uchun navbatsiz)
+    async def save_summary(self, user_id: int, summary: str, covered_ts: int):
+        await self._run(self._save_summary, user_id, summary, covered_ts)
+
+    # Eski yozuvlarning ts ustunini fonda to'ldirish: har bir bo'lak alohida DB vazifasi, shuning uchun
+    # foydalanuvchi so'rovlari bo'laklar orasida bajarilaveradi. ts IS NULL qator qolmaguncha davom etadi
+    # (shu paytda boshqa jarayon qo'shgan eski formatdagi qatorlar ham). Natija: to'ldirilgan qatorlar soni
+    async def backfill_timestamps(self, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+        total = 0
+        while True:
+            count = await self._run(self._backfill_timestamps_batch, batch_size)
+            if not count:
+                return total
+            total += count
+
+    # Muddati o'tgan yozuvlarni bo'laklab o'chirish. Har bir bo'lak alohida DB vazifasi,
+    # shuning uchun foydalanuvchi so'rovlari bo'laklar orasida bajarilaveradi.
+    # Natija: {"rows": {jadval: o'chirilgan qatorlar}, "bytes": bo'shatilgan baytlar}
+    async def apply_retention(self, retention: dict = RETENTION) -> dict:
+        rows = {}
+        now = int(time.time())
+        for table, (column, hours) in retention.items():
+            cutoff = now - hours * 3600
+            deleted = 0
+            for _ in range(RETENTION_MAX_BATCHES):
+                count = await self._run(self._delete_expired_batch, table, column, cutoff, RETENTION_BATCH_SIZE)
+                deleted += count
+                if count < RETENTION_BATCH_SIZE:
+                    break
+            rows[table] = deleted
+        reclaimed = await self._run(self._reclaim_space, RETENTION_VACUUM_PAGES)
+        return {"rows": rows, "bytes": reclaimed}
+
+    # Navbatni yozib, ulanishni yopish va DB oqimini to'xtatish
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        batch = self._take_pending()
+        try:
+            self._run_sync(self._write_batch, *batch)
+        finally:
+            self._run_sync(self._close)
+        self._executor.shutdown(wait=True)
+
+
+# Baza hajmi sahifalar bo'yicha (WAL'dagi hali ko'chirilmagan o'zgarishlar ham hisobga olinadi)
+def database_size(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+# Mavjud bazada auto_vacuum=INCREMENTAL ni yoqish (bitta to'liq VACUUM; bot to'xtatilgan holda)
+def enable_incremental_vacuum(path: str):
+    conn = sqlite3.connect(path)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            logger.info("%s: auto_vacuum allaqachon yoqilgan", path)
+            return
+        size_before = database_size(conn)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        # WAL rejimida VACUUM natijasi avval WAL'ga yoziladi: asosiy fayl shu yerda kichrayadi
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        logger.info("%s: auto_vacuum yoqildi, hajm %d -> %d bayt", path, size_before, database_size(conn))
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ma'lumotlar bazasiga xizmat ko'rsatish (bot to'xtatilgan holda)")
+    parser.add_argument("--db", action="append", help="baza fayli (takrorlash mumkin; odatda DB_PATH)")
+    parser.add_argument("--vacuum", action="store_true", help="auto_vacuum=INCREMENTAL ni yoqish (to'liq VACUUM)")
+    args = parser.parse_args()
+    if not args.vacuum:
+        parser.error("bajariladigan amalni tanlang: --vacuum")
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    for path in args.db or [DB_PATH]:
+        enable_incremental_vacuum(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Bot modullari repozitoriya ildizida joylashgan (paket emas)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
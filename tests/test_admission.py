@@ -0,0 +1,178 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import admission
+from admission import AdmissionController, CircuitBreaker, TokenBucket
+
+
+# admission modulidagi time.monotonic o'rniga qo'lda suriladigan soat
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_bucket_starts_full_and_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == pytest.approx(0.5)
+    clock.advance(0.25)
+    assert not bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.25)
+    clock.advance(0.25)
+    assert bucket.take()
+    assert not bucket.take()
+
+
+def test_bucket_never_exceeds_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    clock.advance(100)
+    assert [bucket.take() for _ in range(3)] == [True, True, False]
+    bucket.refund()
+    bucket.refund()
+    bucket.refund()
+    assert bucket.tokens == 2
+    assert bucket.wait_time() == 0
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failures=3, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened == 1
+    assert breaker.blocked()
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_probe(clock):
+    breaker = CircuitBreaker(failures=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.advance(9.9)
+    assert not breaker.allow()
+    clock.advance(0.1)
+    # blocked() holatni o'zgartirmaydi va sinov so'rovini olmaydi
+    assert not breaker.blocked()
+    assert breaker.state == "open"
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Sinov javobi kelguncha boshqa so'rovlar o'tmaydi
+    assert breaker.blocked()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_breaker_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failures=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.advance(10)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened == 2
+    clock.advance(5)
+    assert not breaker.allow()
+    clock.advance(5)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+
+
+# Javobsiz qolgan (bekor qilingan) sinov so'rovidan reset_timeout o'tgach yangi sinov beriladi
+def test_breaker_replaces_lost_probe(clock):
+    breaker = CircuitBreaker(failures=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.advance(10)
+    assert breaker.allow()
+    clock.advance(9)
+    assert not breaker.allow()
+    clock.advance(1)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+
+
+@pytest.fixture
+def controller(clock, monkeypatch):
+    monkeypatch.setattr(admission, "USER_BURST", 1)
+    monkeypatch.setattr(admission, "USER_RATE", 0.01)
+    controller = AdmissionController()
+    controller.breaker = CircuitBreaker(failures=1, reset_timeout=10)
+    return controller
+
+
+# Uzgich ochiq bo'lsa, foydalanuvchi tokeni sarflanmaydi
+def test_acquire_open_breaker_keeps_user_token(controller, clock):
+    controller.breaker.record_failure()
+    assert asyncio.run(controller.acquire(1)) == "circuit_open"
+    assert 1 not in controller._users
+    controller.breaker.record_success()
+    assert asyncio.run(controller.acquire(1)) is None
+    assert asyncio.run(controller.acquire(1)) == "user_rate"
+    assert controller.shed["circuit_open"] == 1
+    assert controller.shed["user_rate"] == 1
+
+
+# half_open sinovi user_rate bilan tashlangan so'rovga emas, keyingi ruxsat olgan so'rovga beriladi
+def test_acquire_probe_goes_to_admitted_request(controller, clock):
+    assert asyncio.run(controller.acquire(1)) is None
+    controller.breaker.record_failure()
+    clock.advance(10)
+    assert asyncio.run(controller.acquire(1)) == "user_rate"
+    assert controller.breaker.state == "open"
+    assert asyncio.run(controller.acquire(2)) is None
+    assert controller.breaker.state == "half_open"
+    assert asyncio.run(controller.acquire(3)) == "circuit_open"
+    assert 3 not in controller._users
+
+
+# Umumiy navbatda kutish paytida sinovni boshqa so'rov olsa, uzgich oxirgi bosqichda rad etadi
+# va foydalanuvchi hamda umumiy tokenlar qaytariladi
+def test_acquire_refunds_tokens_on_late_rejection(controller, clock, monkeypatch):
+    async def sleep(delay):
+        clock.advance(delay)
+        controller.breaker.allow()
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(admission, "asyncio", SimpleNamespace(sleep=sleep))
+    controller.breaker.record_failure()
+    clock.advance(10)
+    while controller._global.take():
+        pass
+    assert asyncio.run(controller.acquire(1)) == "circuit_open"
+    assert controller.breaker.state == "half_open"
+    assert controller._users[1].tokens == 1
+    assert controller._global.tokens == pytest.approx(1)
+    assert controller.waiting == 0
+    assert controller.admitted == 0
+
+
+def test_acquire_background_needs_closed_breaker(controller, clock):
+    assert controller.acquire_background() is None
+    controller.breaker.record_failure()
+    clock.advance(10)
+    assert controller.acquire_background() == "background"
+    assert controller.breaker.state == "open"
+    assert controller.shed["background"] == 1
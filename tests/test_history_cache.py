@@ -0,0 +1,93 @@
+from collections import deque
+
+from history_cache import ROW_OVERHEAD, HistoryCache
+
+
+def _row(ts: int, text: str = "xabar") -> tuple:
+    return (text, "javob", "uz", "neutral", ts)
+
+
+def _size(row: tuple) -> int:
+    return len(row[0]) + len(row[1]) + ROW_OVERHEAD
+
+
+# Bazadan o'qilgan yozuvlar (yangidan eskiga) bilan foydalanuvchini keshga yuklash
+def _warm(cache: HistoryCache, user_id: int, rows: list, since: int = 0):
+    cache.start_warm(user_id)
+    cache.finish_warm(user_id, list(reversed(rows)), since)
+
+
+def test_turns_cap_keeps_latest_rows():
+    cache = HistoryCache(turns=3, max_users=10, max_bytes=10**6)
+    rows = [_row(ts) for ts in range(1, 6)]
+    _warm(cache, 1, rows[:2])
+    for row in rows[2:]:
+        cache.append(1, row)
+    assert cache.get(1, 0, 3) == list(reversed(rows[2:]))
+    assert cache.stats()["bytes"] == sum(_size(row) for row in rows[2:])
+
+
+# Halqadan katta so'rov va keshlangan oraliqdan eski yozuvlar bazadan o'qiladi
+def test_get_misses_outside_cached_range():
+    cache = HistoryCache(turns=3, max_users=10, max_bytes=10**6)
+    assert cache.get(1, 0, 1) is None
+    _warm(cache, 1, [_row(10), _row(20)], since=5)
+    assert cache.get(1, 0, 4) is None
+    assert cache.get(1, 0, 3) is None
+    assert cache.get(1, 5, 3) == [_row(20), _row(10)]
+    assert cache.get(1, 15, 3) == [_row(20)]
+    assert cache.get(1, 0, 1) == [_row(20)]
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 3
+
+
+def test_max_users_evicts_least_recently_used():
+    cache = HistoryCache(turns=5, max_users=2, max_bytes=10**6)
+    _warm(cache, 1, [_row(1)])
+    _warm(cache, 2, [_row(1)])
+    cache.get(1, 0, 1)
+    _warm(cache, 3, [_row(1)])
+    assert cache.get(2, 0, 1) is None
+    assert cache.get(1, 0, 1) == [_row(1)]
+    assert cache.get(3, 0, 1) == [_row(1)]
+    assert cache.stats()["users"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_max_bytes_evicts_until_under_limit():
+    row = _row(1, "x" * 100)
+    cache = HistoryCache(turns=5, max_users=100, max_bytes=3 * _size(row))
+    for user_id in range(3):
+        _warm(cache, user_id, [row])
+    assert cache.stats()["bytes"] == 3 * _size(row)
+    cache.append(2, _row(2, "x" * 100))
+    assert cache.get(0, 0, 1) is None
+    assert cache.stats()["users"] == 2
+    assert cache.stats()["bytes"] == 3 * _size(row)
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+# Keshda bo'lmagan foydalanuvchi uchun append e'tiborsiz qoldiriladi (baza manba bo'lib qoladi)
+def test_append_ignores_cold_users():
+    cache = HistoryCache(turns=5, max_users=10, max_bytes=10**6)
+    cache.append(1, _row(1))
+    assert cache.stats()["users"] == 0
+    assert cache.stats()["bytes"] == 0
+
+
+# Yuklash paytida yozilgan yozuvlar bazadan o'qilganlardan keyin qo'shiladi; bekor qilinsa tashlanadi
+def test_rows_appended_while_warming():
+    cache = HistoryCache(turns=3, max_users=10, max_bytes=10**6)
+    cache.start_warm(1)
+    cache.append(1, _row(3))
+    cache.append(1, _row(4))
+    cache.finish_warm(1, [_row(2), _row(1)], 0)
+    assert cache.get(1, 0, 3) == [_row(4), _row(3), _row(2)]
+    assert cache._users[1].rows == deque([_row(2), _row(3), _row(4)])
+    assert cache.stats()["bytes"] == 3 * _size(_row(1))
+
+    cache.start_warm(2)
+    cache.append(2, _row(5))
+    cache.cancel_warm(2)
+    cache.finish_warm(2, [_row(1)], 0)
+    assert cache.get(2, 0, 3) == [_row(1)]
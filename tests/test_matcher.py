@@ -0,0 +1,146 @@
+import ast
+import json
+import os
+import random
+import re
+
+import pytest
+
+from matcher import FUNNY_INDICATORS, LANGUAGE_WORDS, SAD_INDICATORS, SAD_LONG_INDICATORS, Matcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# tg.py dagi maxsus javoblar lug'ati (tg moduli telegram kutubxonasisiz yuklanmaydi, shuning uchun
+# qiymat manba matnidan o'qiladi)
+def _custom_responses() -> dict:
+    with open(os.path.join(ROOT, "tg.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "custom_responses":
+            return ast.literal_eval(node.value)
+    raise LookupError("custom_responses topilmadi")
+
+
+CUSTOM_RESPONSES = _custom_responses()
+
+
+# Avvalgi tg.py dagi tasniflagich (o'zgartirilmagan holda): natijalar Matcher bilan solishtiriladi
+def detect_language(message: str) -> str:
+    message = message.lower().strip()
+    cyrillic_pattern = re.compile(r"[а-яё]")
+    latin_pattern = re.compile(r"[a-z]")
+    uzbek_words = {"salom", "nima", "yaxshimisiz", "qalesan", "nima gap", "yaxshilikmi", "qanday"}
+    russian_words = {"привет", "здравствуйте", "как дела", "что нового", "как", "что"}
+    english_words = {"hello", "hi", "how are you", "what's up", "what", "how"}
+    cyrillic_count = len(cyrillic_pattern.findall(message))
+    latin_count = len(latin_pattern.findall(message))
+    uzbek_score = sum(1 for word in uzbek_words if word in message)
+    russian_score = sum(1 for word in russian_words if word in message)
+    english_score = sum(1 for word in english_words if word in message)
+    if cyrillic_count > latin_count and russian_score > 0:
+        return "ru"
+    elif latin_count > cyrillic_count and english_score > 0:
+        return "en"
+    elif uzbek_score > 0 or (latin_count > 0 and not cyrillic_count):
+        return "uz"
+    return "uz"
+
+
+def detect_emotion(message: str) -> str:
+    message = message.lower().strip()
+    funny_indicators = ["haha", "lol", "😂", "😄", "😜", "hazil", "шутка", "joke"]
+    sad_indicators = ["xafa", "yomon", "😢", "😔", "grustno", "sad", "tushkun", "huzur"]
+    word_count = len(message.split())
+
+    funny_score = sum(1 for indicator in funny_indicators if indicator in message)
+    sad_score = sum(1 for indicator in sad_indicators if indicator in message)
+
+    if funny_score > 0 or (word_count <= 5 and "!" in message):
+        return "funny"
+    elif sad_score > 0 or (word_count > 10 and any(word in message for word in ["ko‘nglim", "yomon", "xafa", "grustno", "sad"])):
+        return "sad"
+    else:
+        return "neutral"
+
+
+def old_classify(message: str) -> tuple:
+    language = detect_language(message)
+    emotion = detect_emotion(message)
+    for key, response in CUSTOM_RESPONSES[language].items():
+        if key in message.lower():
+            return language, emotion, key, response
+    return language, emotion, None, None
+
+
+def _dataset_prompts() -> list:
+    with open(os.path.join(ROOT, "airo_dataset.json"), encoding="utf-8") as f:
+        return [entry["prompt"] for entry in json.load(f)]
+
+
+# Tasodifiy xabarlar: naqshlar, ularning bo'laklari, oddiy harflar, emoji va tinish belgilari aralashmasi
+def _random_messages(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    patterns = [word for words in LANGUAGE_WORDS.values() for word in words]
+    patterns += [*FUNNY_INDICATORS, *SAD_INDICATORS, *SAD_LONG_INDICATORS]
+    patterns += [key for responses in CUSTOM_RESPONSES.values() for key in responses]
+    fragments = [pattern[:rng.randint(1, len(pattern))] for pattern in patterns]
+    letters = list("abcdefghijklmnopqrstuvwxyzабвгдеёжзийклмнопрстуфхцчшщъыьэюя") + ["!", "?", "'", "‘", "😂", "😢"]
+    messages = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(1, 16)):
+            kind = rng.random()
+            if kind < 0.35:
+                part = rng.choice(patterns)
+            elif kind < 0.6:
+                part = rng.choice(fragments)
+            else:
+                part = "".join(rng.choice(letters) for _ in range(rng.randint(1, 6)))
+            parts.append(part.upper() if rng.random() < 0.1 else part)
+        messages.append(rng.choice(("", " ")).join(parts) + rng.choice(("", "!", "?", " ", "\n")))
+    return messages
+
+
+MESSAGES = (
+    [key for responses in CUSTOM_RESPONSES.values() for key in responses]
+    + [word for words in LANGUAGE_WORDS.values() for word in words]
+    + [
+        "",
+        "   ",
+        "!",
+        "Salom! Qalesan?",
+        "Привет, как дела?",
+        "Hi there, how are you doing today?",
+        "Bugun kayfiyatim juda yomon, ko‘nglim tushkun, nima qilishni bilmayman, yordam bering iltimos do'stim",
+        "Menga bir hazil aytib ber haha",
+        "what's up что нового",
+    ]
+    + _dataset_prompts()
+    + _random_messages(3000)
+)
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return Matcher(CUSTOM_RESPONSES)
+
+
+def test_matches_old_classifier(matcher):
+    mismatches = []
+    for message in MESSAGES:
+        match = matcher.classify(message)
+        if (match.language, match.emotion, match.key, match.response) != old_classify(message):
+            mismatches.append(message)
+    assert mismatches == []
+
+
+def test_match_fields(matcher):
+    for message in MESSAGES:
+        match = matcher.classify(message)
+        assert match.word_count == len(message.split())
+        assert match.wants_joke == (match.response is not None and "{}" in match.response)
+
+
+def test_classify_many(matcher):
+    assert matcher.classify_many(MESSAGES[:50]) == [matcher.classify(message) for message in MESSAGES[:50]]
@@ -0,0 +1,119 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from storage import MIGRATIONS, backfill_timestamps_batch, migrate
+
+# Eski (migratsiyalardan oldingi) init_db yaratgan sxema: language va emotion ustunlarisiz
+LEGACY_SCHEMA = (
+    "CREATE TABLE chat_history (user_id INTEGER, message TEXT, response TEXT, timestamp TEXT)",
+    "CREATE TABLE user_profiles (user_id INTEGER PRIMARY KEY, language TEXT)",
+)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "chat_history.db")
+    yield conn
+    conn.close()
+
+
+def _version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _columns(conn, table: str) -> list:
+    return [info[1] for info in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _objects(conn, kind: str) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+
+
+def test_fresh_database_reaches_latest_version(conn):
+    migrate(conn)
+    assert _version(conn) == len(MIGRATIONS)
+    assert {"chat_history", "user_profiles", "user_summaries", "response_cache"} <= _objects(conn, "table")
+    assert {
+        "idx_chat_history_user_ts",
+        "idx_chat_history_ts",
+        "idx_user_summaries_updated",
+        "idx_response_cache_created",
+    } <= _objects(conn, "index")
+    assert _columns(conn, "chat_history") == [
+        "user_id", "message", "response", "timestamp", "language", "emotion", "ts",
+    ]
+
+
+# Qayta ishga tushirish hech narsani o'zgartirmaydi
+def test_migrate_is_idempotent(conn):
+    migrate(conn)
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+    migrate(conn)
+    assert _version(conn) == len(MIGRATIONS)
+    assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+
+
+# Faqat joriy versiyadan keyingi migratsiyalar bajariladi
+def test_migrate_resumes_from_stored_version(conn, monkeypatch):
+    import storage
+
+    applied = []
+
+    def record(migration):
+        def run(conn):
+            applied.append(migration.__name__)
+            migration(conn)
+
+        run.__name__ = migration.__name__
+        return run
+
+    monkeypatch.setattr(storage, "MIGRATIONS", MIGRATIONS[:2])
+    migrate(conn)
+    assert _version(conn) == 2
+    monkeypatch.setattr(storage, "MIGRATIONS", tuple(record(migration) for migration in MIGRATIONS))
+    migrate(conn)
+    assert applied == [migration.__name__ for migration in MIGRATIONS[2:]]
+    assert _version(conn) == len(MIGRATIONS)
+
+
+# Eski bazadagi yozuvlar saqlanadi, yangi ustunlar standart qiymat oladi, ts esa keyin to'ldiriladi
+def test_legacy_database_keeps_rows(conn):
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO chat_history VALUES (?, ?, ?, ?)",
+        [(1, "salom", "Assalomu alaykum", "2025-06-13 06:36:30"), (2, "hi", "Hello", "2025-06-14 10:00:00")],
+    )
+    conn.execute("INSERT INTO user_profiles VALUES (1, 'uz')")
+    conn.commit()
+
+    migrate(conn)
+
+    assert _version(conn) == len(MIGRATIONS)
+    rows = conn.execute("SELECT user_id, message, language, emotion, ts FROM chat_history ORDER BY rowid").fetchall()
+    assert rows == [(1, "salom", "uz", "neutral", None), (2, "hi", "uz", "neutral", None)]
+    assert conn.execute("SELECT * FROM user_profiles").fetchall() == [(1, "uz")]
+
+
+# Matnli vaqt mahalliy vaqt sifatida epoch'ga o'giriladi, o'qilmaydigani 0 bo'ladi; bo'lak chegarasi saqlanadi
+def test_backfill_timestamps_in_batches(conn):
+    migrate(conn)
+    stamps = ["2025-06-13 06:36:30", "2025-06-14 10:00:00", "2025-06-15 23:59:59", "not a date", None]
+    conn.executemany(
+        "INSERT INTO chat_history (user_id, message, response, timestamp) VALUES (1, 'm', 'r', ?)",
+        [(stamp,) for stamp in stamps],
+    )
+    conn.commit()
+
+    assert backfill_timestamps_batch(conn, batch_size=2) == 2
+    assert conn.execute("SELECT COUNT(*) FROM chat_history WHERE ts IS NULL").fetchone()[0] == 3
+    while backfill_timestamps_batch(conn, batch_size=2):
+        pass
+
+    expected = [
+        int(datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S").timestamp()) for stamp in stamps[:3]
+    ] + [0, 0]
+    assert [row[0] for row in conn.execute("SELECT ts FROM chat_history ORDER BY rowid")] == expected
+    assert backfill_timestamps_batch(conn) == 0
@@ -0,0 +1,39 @@
+from collections import Counter
+
+import pytest
+
+from sharding import HashRing
+
+USERS = range(1_000_000_000, 1_000_020_000)
+
+
+# Bir xil sozlamali halqalar (masalan, turli jarayonlarda) foydalanuvchini bir xil shardga beradi
+def test_mapping_is_deterministic():
+    first, second = HashRing(4), HashRing(4)
+    shards = [first.shard_for(user_id) for user_id in USERS]
+    assert shards == [second.shard_for(user_id) for user_id in USERS]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_single_shard():
+    ring = HashRing(1)
+    assert {ring.shard_for(user_id) for user_id in USERS} == {0}
+
+
+@pytest.mark.parametrize("shards", [2, 4, 8])
+def test_load_is_balanced(shards):
+    ring = HashRing(shards)
+    counts = Counter(ring.shard_for(user_id) for user_id in USERS)
+    share = len(USERS) / shards
+    assert min(counts.values()) > 0.75 * share
+    assert max(counts.values()) < 1.25 * share
+
+
+# N -> N+1: faqat taxminan 1/(N+1) qism ko'chadi va hammasi yangi shardga o'tadi.
+# Teskari yo'nalishda (oxirgi shard olib tashlansa) faqat uning foydalanuvchilari ko'chadi
+@pytest.mark.parametrize("shards", [1, 2, 4, 8])
+def test_resize_moves_only_new_shard_users(shards):
+    before, after = HashRing(shards), HashRing(shards + 1)
+    moved = [user_id for user_id in USERS if before.shard_for(user_id) != after.shard_for(user_id)]
+    assert {after.shard_for(user_id) for user_id in moved} == {shards}
+    assert len(moved) / len(USERS) == pytest.approx(1 / (shards + 1), abs=0.05)
@@ -1,171 +1,239 @@
+import asyncio
 import logging
+import multiprocessing
 import os
-import re
-import sqlite3
 import random
-from datetime import datetime, timedelta
-from telegram import Update
+import signal
+import threading
+import time
+
+# Modul yuklanishi boshlangan vaqt (ishga tushish bosqichlari shundan hisoblanadi)
+IMPORT_STARTED = time.perf_counter()
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
-import google.generativeai as genai
 from dotenv import load_dotenv
+from admission import AdmissionController
+from coalescer import MessageCoalescer
+from context_builder import ContextBuilder, estimate_tokens
+from log_config import LOG_FILE, logging_stats, setup_logging, shutdown_logging
+from matcher import Matcher
+from metrics import METRICS_PORT, Metrics
+from prompts import (
+    FALLBACK_RESPONSES,
+    HELP_RESPONSES,
+    HISTORY_BUTTONS,
+    HISTORY_EMPTY_RESPONSES,
+    HISTORY_HEADERS,
+    JOKE_RESPONSES,
+    MAX_TOKENS,
+    START_RESPONSES,
+    finalize_reply,
+    render_prompt,
+    strip_greetings,
+)
+from response_cache import ResponseCache
+from sharding import SHARD_COUNT, HashRing, all_db_paths, history_bound, read_history_page, shard_paths
+from storage import DB_PATH, Storage
+from update_processor import PerUserUpdateProcessor
 
-# .env faylini yuklash
+# .env faylini yuklash (sozlamalar quyida modul darajasida o'qiladi; kalitlar faqat main() da tekshiriladi)
 load_dotenv()
 
-# Logging sozlamalari
-logging.basicConfig(
-    filename="bot.log",
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
+# Logging main() ichida sozlanadi (log_config: navbat orqali alohida oqimda, aylantiriladigan JSON fayl)
 logger = logging.getLogger(__name__)
 
-# Gemini API sozlamalari
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY muhit o‘zgaruvchisi o‘rnatilmagan!")
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel("gemini-1.5-flash")
-
-# SQLite ma'lumotlar bazasini sozlash
-def init_db():
-    conn = sqlite3.connect("chat_history.db")
-    c = conn.cursor()
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS chat_history
-                 (user_id INTEGER, message TEXT, response TEXT, timestamp TEXT, language TEXT, emotion TEXT)"""
-    )
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS user_profiles
-                 (user_id INTEGER PRIMARY KEY, language TEXT)"""
-    )
-    c.execute("PRAGMA table_info(chat_history)")
-    columns = [info[1] for info in c.fetchall()]
-    if "language" not in columns:
-        c.execute("ALTER TABLE chat_history ADD COLUMN language TEXT DEFAULT 'uz'")
-    if "emotion" not in columns:
-        c.execute("ALTER TABLE chat_history ADD COLUMN emotion TEXT DEFAULT 'neutral'")
-    conn.commit()
-    conn.close()
-
-# Foydalanuvchi profilini saqlash
-def save_user_profile(user_id: int, language: str):
-    conn = sqlite3.connect("chat_history.db")
-    c = conn.cursor()
-    c.execute(
-        "INSERT OR REPLACE INTO user_profiles (user_id, language) VALUES (?, ?)",
-        (user_id, language),
-    )
-    conn.commit()
-    conn.close()
-
-# Foydalanuvchi profilini olish
-def get_user_profile(user_id: int) -> str:
-    conn = sqlite3.connect("chat_history.db")
-    c = conn.cursor()
-    c.execute("SELECT language FROM user_profiles WHERE user_id = ?", (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else "uz"
-
-# Suhbat tarixini saqlash
-def save_message(user_id: int, message: str, response: str, language: str, emotion: str):
-    conn = sqlite3.connect("chat_history.db")
-    c = conn.cursor()
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute(
-        "INSERT INTO chat_history (user_id, message, response, timestamp, language, emotion) VALUES (?, ?, ?, ?, ?, ?)",
-        (user_id, message, response, timestamp, language, emotion),
-    )
-    conn.commit()
-    conn.close()
-
-# Suhbat tarixini olish
-def get_chat_history(user_id: int, time_limit_hours: int = 12, max_messages: int = 100):
-    conn = sqlite3.connect("chat_history.db")
-    c = conn.cursor()
-    time_threshold = (datetime.now() - timedelta(hours=time_limit_hours)).strftime(
-        "%Y-%m-%d %H:%M:%S"
-    )
-    c.execute(
-        "SELECT message, response, language, emotion FROM chat_history WHERE user_id = ? AND timestamp >= ? ORDER BY timestamp DESC LIMIT ?",
-        (user_id, time_threshold, max_messages),
-    )
-    history = c.fetchall()
-    conn.close()
-    return history
-
-# Ma'lumotlar bazasini tozalash
-def clean_old_messages():
-    conn = sqlite3.connect("chat_history.db")
-    c = conn.cursor()
-    time_threshold = (datetime.now() - timedelta(days=2)).strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("DELETE FROM chat_history WHERE timestamp < ?", (time_threshold,))
-    conn.commit()
-    conn.close()
+# Gemini modeli. google.generativeai og'ir kutubxona, shuning uchun u va model birinchi kerak bo'lganda
+# (yoki start_model_warmup() orqali fonda) yuklanadi: modulni kalitlarsiz ham import qilish mumkin
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+model = None
+_model_lock = threading.Lock()
+
+# Gemini so'rovlari uchun cheklovlar: bir vaqtdagi so'rovlar soni va har bir so'rov uchun vaqt chegarasi
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+# Oqimli (streaming) javob: qaysi uzunlikdagi javoblar bo'laklab yuboriladi va
+# Telegram xabarini tahrirlash oralig'i (Telegram tahrirlash tezligini cheklaydi)
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "1") == "1"
+STREAM_LENGTHS = set(os.getenv("STREAM_LENGTHS", "medium,long").split(","))
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# Eski yozuvlarni tozalash oralig'i (soniya)
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "600"))
+# Navbatdagi yozuvlarni bazaga yozish oralig'i (soniya)
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0"))
+# /history sahifasidagi suhbatlar soni (sahifa baribir Telegram xabari chegarasidan oshmaydi)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "10"))
+# Birinchi sahifa kaliti: eng yangi yozuvdan boshlanadi
+HISTORY_START = (2**62, 0, 0)
+
+# Ishga tushirish rejimi: "polling" yoki "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Bir vaqtda qayta ishlanadigan yangilanishlar soni (bitta foydalanuvchiniki baribir ketma-ket)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+# Webhook sozlamalari: ichki HTTP server manzili, Telegram'ga beriladigan tashqi URL va maxfiy token
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# To'xtashda ishlayotgan javoblarni kutish muddati (soniya)
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "25"))
+
+# Gemini modelini olish (birinchi chaqiruvda kutubxona yuklanib, model yaratiladi)
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY muhit o‘zgaruvchisi o‘rnatilmagan!")
+                import google.generativeai as genai
+
+                genai.configure(api_key=api_key)
+                model = genai.GenerativeModel(GEMINI_MODEL)
+    return model
+
+# Modelni fonda tayyorlash: kutubxona yuklanishi bazani ochish va Telegram ulanishi bilan parallel ketadi
+def start_model_warmup() -> None:
+    threading.Thread(target=get_model, name="airo-gemini-warmup", daemon=True).start()
+
+# Gemini orqali javobni event loop'ni bloklamasdan olish
+async def generate_text(prompt: str, max_tokens: int) -> str:
+    async with gemini_semaphore:
+        response = await asyncio.wait_for(
+            get_model().generate_content_async(
+                prompt,
+                generation_config={"max_output_tokens": max_tokens, "temperature": 1.0},
+            ),
+            timeout=GEMINI_TIMEOUT,
+        )
+    return response.text
+
+# Gemini javobini bo'laklab olish; har bir yangi bo'lakdan keyin on_text(hozirgacha_matn) chaqiriladi.
+# on_text kutilmaydi (Telegram'ga yuborish StreamingReply vazifasida): sekin tahrirlar gemini_semaphore'ni ushlamaydi
+async def stream_text(prompt: str, max_tokens: int, on_text) -> str:
+    async with gemini_semaphore:
+        started = time.perf_counter()
+        response = await get_model().generate_content_async(
+            prompt,
+            generation_config={"max_output_tokens": max_tokens, "temperature": 1.0},
+            stream=True,
+        )
+        parts = []
+        async for chunk in response:
+            if not parts:
+                ttft = time.perf_counter() - started
+                logger.info("Gemini birinchi bo'lak (TTFT): %.2f s", ttft,
+                            extra={"stage": "generate", "latency_ms": round(ttft * 1000, 1)})
+            parts.append(chunk.text)
+            on_text("".join(parts))
+    return "".join(parts)
+
+# Suhbat xulosasi uchun Gemini chaqiruvi (fon vazifasi): kirish nazoratidan o'tadi, lekin kutmaydi.
+# Ruxsat berilmasa None qaytaradi, natija esa foydalanuvchi so'rovlari kabi uzgichga hisoblanadi
+async def summarize_text(prompt: str, max_tokens: int):
+    if admission.acquire_background() is not None:
+        return None
+    try:
+        text = await generate_text(prompt, max_tokens)
+    except Exception:
+        admission.breaker.record_failure()
+        raise
+    admission.breaker.record_success()
+    return text
+
+# Bo'laklab kelayotgan javobni bitta Telegram xabarida ko'rsatish: birinchi bo'lak yangi xabar
+# sifatida yuboriladi, keyingilari STREAM_EDIT_INTERVAL dan tez bo'lmagan tahrirlar bilan qo'shiladi.
+# Oraliq matnlar alohida vazifada yuboriladi: Gemini oqimi Telegram'ni kutmaydi, yuborilmay turgan oraliq
+# matn esa yangisi bilan almashtiriladi. Oraliq yuborish xatolari Gemini xatosi hisoblanmaydi
+class StreamingReply:
+    def __init__(self, update: Update):
+        self.update = update
+        self.message = None
+        self.sent = ""
+        self.last_edit = 0.0
+        self._latest = None
+        self._task = None
+
+    def show_partial(self, text: str) -> None:
+        self._latest = text
+        if self._task is None:
+            self._task = asyncio.create_task(self._send_partials())
+
+    async def _send_partials(self) -> None:
+        try:
+            while self._latest is not None:
+                text, self._latest = self._latest, None
+                await self._send(text)
+        except Exception as e:
+            # Oraliq javob yuborilmasa (masalan, tezlik chegarasi), yakuniy javob baribir yuboriladi
+            logger.warning("Oraliq javob yuborilmadi: %s", e, extra={"stage": "reply"})
+        finally:
+            self._task = None
+
+    async def _send(self, text: str, final: bool = False) -> None:
+        if not text or text == self.sent:
+            return
+        now = time.monotonic()
+        if self.message is None:
+            self.message = await self.update.message.reply_text(text)
+        elif final or now - self.last_edit >= STREAM_EDIT_INTERVAL:
+            await self.message.edit_text(text)
+        else:
+            return
+        self.sent = text
+        self.last_edit = now
+
+    # Yakuniy matn: avval oraliq yuborish tugashi kutiladi (birinchi xabar ikki marta yuborilmasligi uchun)
+    async def show(self, text: str) -> None:
+        self._latest = None
+        if self._task is not None:
+            await self._task
+        await self._send(text, final=True)
+
+# Ma'lumotlar bazasi qatlami (doimiy ulanish, alohida DB oqimi)
+storage = Storage(DB_PATH)
+
+# Promptdagi suhbat tarixi token chegarasida yig'iladi, eski suhbatlar xulosaga jamlanadi
+context_builder = ContextBuilder(storage, summarize_text)
+
+# Takroriy qisqa savollarga javoblar keshi (RESPONSE_CACHE_LENGTHS bilan yoqiladi)
+response_cache = ResponseCache(storage)
+
+# Yangilanishlarni parallel, lekin har bir foydalanuvchi uchun tartib bilan qayta ishlash
+update_processor = PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES)
+
+# Bosqichlar bo'yicha vaqtlar, hisoblagichlar va /metrics manzili (METRICS_PORT bilan yoqiladi)
+metrics = Metrics(started=IMPORT_STARTED)
+
+# Gemini so'rovlari uchun foydalanuvchi/umumiy tezlik chegarasi, kutish navbati va uzgich
+admission = AdmissionController()
 
 # Tilni aniqlash
 def detect_language(message: str) -> str:
-    message = message.lower().strip()
-    cyrillic_pattern = re.compile(r"[а-яё]")
-    latin_pattern = re.compile(r"[a-z]")
-    uzbek_words = {
-        "salom",
-        "nima",
-        "yaxshimisiz",
-        "qalesan",
-        "nima gap",
-        "yaxshilikmi",
-        "qanday",
-    }
-    russian_words = {
-        "привет",
-        "здравствуйте",
-        "как дела",
-        "что нового",
-        "как",
-        "что",
-    }
-    english_words = {"hello", "hi", "how are you", "what's up", "what", "how"}
-    cyrillic_count = len(cyrillic_pattern.findall(message))
-    latin_count = len(latin_pattern.findall(message))
-    uzbek_score = sum(1 for word in uzbek_words if word in message)
-    russian_score = sum(1 for word in russian_words if word in message)
-    english_score = sum(1 for word in english_words if word in message)
-    if cyrillic_count > latin_count and russian_score > 0:
-        return "ru"
-    elif latin_count > cyrillic_count and english_score > 0:
-        return "en"
-    elif uzbek_score > 0 or (latin_count > 0 and not cyrillic_count):
-        return "uz"
-    return "uz"
+    return matcher.classify(message).language
 
 # Hissiyotni aniqlash
 def detect_emotion(message: str) -> str:
-    message = message.lower().strip()
-    funny_indicators = ["haha", "lol", "😂", "😄", "😜", "hazil", "шутка", "joke"]
-    sad_indicators = ["xafa", "yomon", "😢", "😔", "grustno", "sad", "tushkun", "huzur"]
-    word_count = len(message.split())
-    
-    funny_score = sum(1 for indicator in funny_indicators if indicator in message)
-    sad_score = sum(1 for indicator in sad_indicators if indicator in message)
-    
-    if funny_score > 0 or (word_count <= 5 and "!" in message):
-        return "funny"
-    elif sad_score > 0 or (word_count > 10 and any(word in message for word in ["ko‘nglim", "yomon", "xafa", "grustno", "sad"])):
-        return "sad"
-    else:
-        return "neutral"
+    return matcher.classify(message).emotion
 
 # Savol uzunligini tahlil qilish
-def analyze_message_length(message: str) -> str:
-    word_count = len(message.split())
+def analyze_message_length(message: str, word_count: int = None) -> str:
+    if word_count is None:
+        word_count = len(message.split())
     if word_count <= 5:
         return "short"
     elif word_count <= 15:
@@ -248,248 +316,506 @@ jokes = {
     ],
 }
 
+# Maxsus javoblar, til va hissiyot belgilari uchun bir martalik moslashtiruvchi
+matcher = Matcher(custom_responses)
+
+# Xafa foydalanuvchiga yuklama paytida beriladigan maxsus javob kaliti
+SHED_SAD_KEYS = {"uz": "xafa", "ru": "грустно", "en": "sad"}
+
+# Gemini so'rovi qabul qilinmaganda (tezlik chegarasi, navbat to'lgan, uzgich ochiq) tayyor javob
+def shed_response(language: str, emotion: str) -> str:
+    joke_text = random.choice(jokes[language])
+    if emotion == "sad":
+        return custom_responses[language][SHED_SAD_KEYS[language]].format(joke_text)
+    return JOKE_RESPONSES[language].format(joke=joke_text)
+
 # /start buyrug'i
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.message.from_user.id
-    init_db()
-    clean_old_messages()
-    language = detect_language(update.message.text)
+    timer = metrics.timer("start", user_id)
+    # Oldin yuborilgan xabarlarga javob (va ularning tarixga yozilishi) buyruqdan oldin
+    with timer.stage("pending"):
+        await coalescer.flush(user_id)
+    with timer.stage("detect"):
+        language = detect_language(update.message.text)
+    timer.language = language
     context.user_data["language"] = language
     context.user_data["started"] = True
-    save_user_profile(user_id, language)
-    response = {
-        "uz": f"Assalomu alaykum, {update.message.from_user.first_name}! 😊 Men AIRO, hazilkash va mehribon botman! Kayfiyating qanday, do'stim? 😎",
-        "ru": f"Привет, {update.message.from_user.first_name}! 😊 Я AIRO, весёлый и добрый бот! Как настроение, кoresh? 😎",
-        "en": f"Yo, {update.message.from_user.first_name}! 😊 I'm AIRO, a witty and kind bot! How's your vibe, mate? 😎",
-    }[language]
-    save_message(user_id, "/start", response, language, "neutral")
-    await update.message.reply_text(response)
+    response = START_RESPONSES[language].format(name=update.message.from_user.first_name)
+    with timer.stage("save"):
+        await storage.save_user_profile(user_id, language)
+        await storage.save_message(user_id, "/start", response, language, "neutral")
+    with timer.stage("reply"):
+        await update.message.reply_text(response)
+    timer.finish("ok")
 
 # /help buyrug'i
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.message.from_user.id
-    language = context.user_data.get("language", get_user_profile(user_id))
-    response = {
-        "uz": "Buyruqlar:\n/start - Botni yangidan boshlash\n/help - Shu yordam\n/joke - Zo'r hazil\n/history - Oldingi suhbatlar\nNima gaplashamiz, do'stim? 😜",
-        "ru": "Команды:\n/start - Перезапуск бота\n/help - Эта помощь\n/joke - Классная шутка\n/history - История чата\nЧё болтаем, кoresh? 😜",
-        "en": "Commands:\n/start - Restart the bot\n/help - This help\n/joke - Dope joke\n/history - Chat history\nWhat's up, mate? 😜",
-    }[language]
-    save_message(user_id, "/help", response, language, "neutral")
-    await update.message.reply_text(response)
+    timer = metrics.timer("help", user_id)
+    with timer.stage("pending"):
+        await coalescer.flush(user_id)
+    with timer.stage("profile"):
+        language = context.user_data.get("language") or await storage.get_user_profile(user_id)
+    response = HELP_RESPONSES[language]
+    with timer.stage("save"):
+        await storage.save_message(user_id, "/help", response, language, "neutral")
+    with timer.stage("reply"):
+        await update.message.reply_text(response)
+    timer.finish("ok")
 
 # /joke buyrug'i
 async def joke(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.message.from_user.id
-    language = context.user_data.get("language", get_user_profile(user_id))
+    timer = metrics.timer("joke", user_id)
+    with timer.stage("pending"):
+        await coalescer.flush(user_id)
+    with timer.stage("profile"):
+        language = context.user_data.get("language") or await storage.get_user_profile(user_id)
     joke_text = random.choice(jokes[language])
-    response = {
-        "uz": f"Mana hazil: {joke_text} 😄 Yana nima gaplashamiz?",
-        "ru": f"Держи шутку: {joke_text} 😄 Чё дальше?",
-        "en": f"Here's a joke: {joke_text} 😄 What's next?",
-    }[language]
-    save_message(user_id, "/joke", response, language, "funny")
-    await update.message.reply_text(response)
-
-# /history buyrug'i
+    response = JOKE_RESPONSES[language].format(joke=joke_text)
+    with timer.stage("save"):
+        await storage.save_message(user_id, "/joke", response, language, "funny")
+    with timer.stage("reply"):
+        await update.message.reply_text(response)
+    timer.finish("ok")
+
+# Telegram xabar uzunligini UTF-16 birliklarida hisoblaydi
+def telegram_length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+# /history sahifasi: kalitdan oldingi (older) yoki keyingi yozuvlar, kalitdan uzoqlashish tartibida.
+# Qatorlar: (ts, db, rowid, message, response, language, emotion), db 0 - joriy baza
+async def load_history_page(user_id: int, older: bool, key: tuple) -> list:
+    limit = HISTORY_PAGE_SIZE + 1
+    # Navbatdagi (hali yozilmagan) xabarlar ham ko'rinishi uchun
+    await storage.flush()
+    ts, rowid = history_bound(key, 0, older)
+    rows = [(row[0], 0) + row[1:] for row in await storage.get_history_page(user_id, older, ts, rowid, limit)]
+    # Shard rejimida boshqa shard bazalarida qolgan (hali ko'chirilmagan) yozuvlar ham qo'shiladi
+    if SHARD_COUNT > 1:
+        other_paths = [path for path in all_db_paths() if os.path.abspath(path) != os.path.abspath(storage.path)]
+        if other_paths:
+            rows += await asyncio.to_thread(read_history_page, other_paths, user_id, older, key, limit)
+            rows.sort(key=lambda row: row[:3], reverse=older)
+    return rows[:limit]
+
+# Sahifa matni va tugmalari. Suhbatlar xabar chegarasiga sig'guncha qo'shiladi (juda uzun bitta suhbat
+# qisqartiriladi), tugmalar ko'rsatilgan eng eski va eng yangi yozuv kalitidan davom etadi
+def render_history_page(language: str, rows: list, older: bool, first_page: bool) -> tuple:
+    header = HISTORY_HEADERS[language]
+    budget = MessageLimit.MAX_TEXT_LENGTH - telegram_length(header)
+    shown = []
+    entries = []
+    for row in rows[:HISTORY_PAGE_SIZE]:
+        _, _, _, msg, resp, lang, emotion = row
+        entry = f"👤 Sen ({lang}, {emotion}): {msg}\n{resp}\n---\n"
+        size = telegram_length(entry)
+        if size > budget:
+            if entries:
+                break
+            entry = entry[:budget - 1]
+            while telegram_length(entry) > budget - 1:
+                entry = entry[:-1]
+            entry += "…"
+            size = telegram_length(entry)
+        shown.append(row)
+        entries.append(entry)
+        budget -= size
+    has_more = len(rows) > len(shown)
+    if older:
+        shown.reverse()
+        entries.reverse()
+    has_older = has_more if older else True
+    has_newer = not first_page if older else has_more
+    older_label, newer_label = HISTORY_BUTTONS[language]
+    buttons = []
+    if has_older:
+        buttons.append(InlineKeyboardButton(older_label, callback_data="history:older:{}:{}:{}".format(*shown[0][:3])))
+    if has_newer:
+        buttons.append(InlineKeyboardButton(newer_label, callback_data="history:newer:{}:{}:{}".format(*shown[-1][:3])))
+    return header + "".join(entries), InlineKeyboardMarkup([buttons]) if buttons else None
+
+# /history buyrug'i: eng yangi suhbatlar sahifasi (suhbat sifatida saqlanmaydi)
 async def history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.message.from_user.id
-    language = context.user_data.get("language", get_user_profile(user_id))
-    chat_history = get_chat_history(user_id)
-    if not chat_history:
-        response = {
-            "uz": "Hozircha suhbat tarixing yo'q, do'stim. 😊 Gaplashamizmi?",
-        "ru": "Пока нет истории чата, кoresh. 😊 Погнали болтать?",
-        "en": "No chat history yet, mate. 😊 Wanna chat?",
-    }[language]
-    save_message(user_id, "/history", response, language, "neutral")
-    await update.message.reply_text(response)
-    return
-    response = {
-        "uz": "Mana sening so'nggi suhbatlaring:\n",
-        "ru": "Вот твои последние чаты:\n",
-        "en": "Here's your recent chats:\n",
-    }[language]
-    for msg, resp, lang, emotion in reversed(chat_history):
-        response += f"👤 Sen ({lang}, {emotion}): {msg}\n{resp}\n---\n"
-    save_message(user_id, "/history", response, language, "neutral")
-    await update.message.reply_text(response)
-
-# Foydalanuvchi xabarlariga javob berish
+    timer = metrics.timer("history", user_id)
+    with timer.stage("pending"):
+        await coalescer.flush(user_id)
+    with timer.stage("profile"):
+        language = context.user_data.get("language") or await storage.get_user_profile(user_id)
+    timer.language = language
+    with timer.stage("history"):
+        rows = await load_history_page(user_id, True, HISTORY_START)
+    if not rows:
+        response, markup = HISTORY_EMPTY_RESPONSES[language], None
+        outcome = "empty"
+    else:
+        with timer.stage("render"):
+            response, markup = render_history_page(language, rows, True, True)
+        outcome = "ok"
+    with timer.stage("reply"):
+        await update.message.reply_text(response, reply_markup=markup)
+    timer.finish(outcome)
+
+# /history tugmalari: "history:<older|newer>:<ts>:<db>:<rowid>" kalitidan keyingi sahifaga o'tish
+async def history_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    user_id = query.from_user.id
+    timer = metrics.timer("history_page", user_id)
+    _, direction, ts, db, rowid = query.data.split(":")
+    older = direction == "older"
+    with timer.stage("profile"):
+        language = context.user_data.get("language") or await storage.get_user_profile(user_id)
+    timer.language = language
+    with timer.stage("history"):
+        rows = await load_history_page(user_id, older, (int(ts), int(db), int(rowid)))
+    if not rows:
+        # Yozuvlar orada o'chirilgan (muddati o'tgan) bo'lishi mumkin
+        await query.answer()
+        timer.finish("empty")
+        return
+    with timer.stage("render"):
+        response, markup = render_history_page(language, rows, older, False)
+    with timer.stage("reply"):
+        await query.answer()
+        try:
+            await query.edit_message_text(response, reply_markup=markup)
+        except BadRequest as e:
+            # Tugma ikki marta bosilsa sahifa o'zgarmaydi
+            if "not modified" not in str(e):
+                raise
+    timer.finish("ok")
+
+# Foydalanuvchi xabarlarini qabul qilish: javob coalescer orqali partiyalab beriladi
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.message.from_user.id
-    user_message = update.message.text
-    language = detect_language(user_message)
-    emotion = detect_emotion(user_message)
+    coalescer.submit(update.message.from_user.id, (update, context))
+
+# Tayyor javobni saqlab yuborish (maxsus javob, kesh, tashlangan so'rov) va so'rovni yakunlash
+async def send_ready_response(timer, update: Update, user_id: int, user_message: str, response: str,
+                              language: str, emotion: str, outcome: str) -> None:
+    coalescer.commit(user_id)
+    with timer.stage("save"):
+        await storage.save_message(user_id, user_message, response, language, emotion)
+    with timer.stage("reply"):
+        await update.message.reply_text(response)
+    metrics.events.inc(outcome)
+    timer.finish(outcome)
+
+# Bir foydalanuvchining ketma-ket kelgan xabarlariga bitta javob berish (oxirgi xabarga javob qaytadi)
+async def respond(user_id: int, items: list) -> None:
+    update, context = items[-1]
+    user_message = "\n".join(item[0].message.text for item in items)
+    timer = metrics.timer("handle_message", user_id)
+    # Til, hissiyot va maxsus javob matn bo'yicha bitta o'tishda aniqlanadi
+    with timer.stage("detect"):
+        match = matcher.classify(user_message)
+    language = match.language
+    emotion = match.emotion
+    timer.language = language
     context.user_data["language"] = language
-    save_user_profile(user_id, language)
+    await storage.save_user_profile(user_id, language)
 
     # Maxsus javoblarni tekshirish
-    for key, response in custom_responses[language].items():
-        if key in user_message.lower():
-            if "{}" in response:
+    if match.response is not None:
+        with timer.stage("canned_match"):
+            response = match.response
+            if match.wants_joke:
                 response = response.format(random.choice(jokes[language]))
-            save_message(user_id, user_message, response, language, emotion)
-            await update.message.reply_text(response)
-            return
+        await send_ready_response(timer, update, user_id, user_message, response, language, emotion, "canned")
+        return
 
     # Savol uzunligini aniqlash
-    message_length = analyze_message_length(user_message)
+    message_length = analyze_message_length(user_message, match.word_count)
 
     # Suhbat tarixini olish
-    chat_history = get_chat_history(user_id)
-    history_prompt = ""
-    for msg, resp, lang, emo in reversed(chat_history):
-        history_prompt += f"Foydalanuvchi ({lang}, {emo}): {msg}\n{resp}\n"
-
-    # Hissiyotga mos ko'rsatma
-    emotion_instruction = {
-        "uz": {
-            "funny": "Javobni quvnoq, hazilkash va kulgili qil, smayliklar ishlat! 😜",
-            "sad": "Javobni mehribon, tasalli beruvchi va dalda beruvchi qil, foydalanuvchini ko'tar! 😊",
-            "neutral": "Javobni do'stona va hazilkash qil, tabiiy uslubda. 😎",
-        },
-        "ru": {
-            "funny": "Otvechay veselo, s yumorkom i prikolami, ispol'zuy smayliki! 😜",
-            "sad": "Otvechay dobrotno, uteshitel'no i podbadrivayushche, podnimi nastroeniye! 😊",
-            "neutral": "Otvechay po-druzheski i s yumorkom, v natural'nom stile. 😎",
-        },
-        "en": {
-            "funny": "Answer in a fun, witty, and humorous way, use emojis! 😜",
-            "sad": "Answer kindly, comfortingly, and encouragingly, cheer them up! 😊",
-            "neutral": "Answer in a friendly and humorous way, keep it natural. 😎",
-        },
-    }[language][emotion]
-
-    # Javob uzunligi bo'yicha ko'rsatma
-    length_instruction = (
-        "Javobni 1-2 jumlada ber." if message_length == "short" else
-        "Javobni 3-4 jumlada ber." if message_length == "medium" else
-        "Javobni 5-6 jumlada ber."
-    ) if language == "uz" else (
-        "Otvechay v 1-2 predlozheniyakh." if message_length == "short" else
-        "Otvechay v 3-4 predlozheniyakh." if message_length == "medium" else
-        "Otvechay v 5-6 predlozheniyakh."
-    ) if language == "ru" else (
-        "Answer in 1-2 sentences." if message_length == "short" else
-        "Answer in 3-4 sentences." if message_length == "medium" else
-        "Answer in 5-6 sentences."
-    )
+    with timer.stage("history"):
+        chat_history = await storage.get_chat_history(user_id)
+
+    # Javoblar keshini tekshirish
+    cache_key = None
+    if response_cache.enabled_for(message_length):
+        with timer.stage("cache"):
+            cache_key = response_cache.key(user_message, language, emotion, message_length, chat_history)
+            cached = await response_cache.get(cache_key)
+        if cached is not None:
+            await send_ready_response(timer, update, user_id, user_message, cached, language, emotion, "cache_hit")
+            return
+        metrics.events.inc("cache_miss")
+
+    # Gemini'ga kirish ruxsati: chegaradan oshganda javob tayyor matnlardan beriladi.
+    # Navbatda kutayotganda yangi xabar kelsa, partiya bekor qilinadi va token qaytariladi
+    with timer.stage("admission"):
+        shed = await admission.acquire(user_id)
+    if shed is not None:
+        logger.warning("So'rov tashlandi (%s)", shed, extra={"user_id": user_id, "language": language, "stage": "admission", "outcome": "shed"})
+        response = shed_response(language, emotion)
+        await send_ready_response(timer, update, user_id, user_message, response, language, emotion, "shed")
+        return
+    # Ruxsat olingan partiya yakuniy: Gemini chaqiruvi yangi xabarlar tufayli bekor qilinmaydi (token va
+    # uzgich sinovi behuda ketmaydi), shundan keyin kelgan xabarlar keyingi partiyaga qoladi
+    coalescer.commit(user_id)
+
+    # Kontekst ruxsatdan keyin yig'iladi: tashlangan so'rovlar fon xulosasini boshlamaydi
+    with timer.stage("context"):
+        history_prompt = await context_builder.build(user_id, language, message_length, chat_history)
 
     # Gemini orqali javob generatsiya qilish
+    reply = StreamingReply(update)
+
+    def show_partial(partial: str) -> None:
+        reply.show_partial(strip_greetings(partial, language))
+
+    with timer.stage("render"):
+        prompt = render_prompt(language, emotion, message_length, history_prompt, user_message)
+    metrics.tokens.inc("prompt", amount=estimate_tokens(prompt, language))
+    started = time.perf_counter()
+    # Uzgichga faqat Gemini chaqiruvining natijasi hisoblanadi; javobni saqlash va Telegram'ga yuborish
+    # xatolari Gemini xatosi emas (ular coalescer'da loglanadi)
     try:
-        max_tokens = {"short": 100, "medium": 200, "long": 400}[message_length]
-        prompt = {
-            "uz": (
-                "Siz AIRO, o'zbek tilida ravon gaplashadigan, hazilkash va mehribon botsiz! 😊\n"
-                "Hech qachon 'salom', 'assalomu alaykum', 'привет', 'hello' kabi salomlashuv so'zlarini ishlatma, chunki suhbat allaqachon boshlangan.\n"
-                "Foydalanuvchi bilan do'stona suhbatlash, lekin 'ukam', 'do'stim', 'nima los?', 'zo'r-da!' kabi iboralarni faqat vaqti-vaqti bilan ishlat.\n"
-                f"Foydalanuvchi xabarining hissiy ohangi: {emotion}. {emotion_instruction}\n"
-                "Suhbatni uzluksiz davom ettir, oldingi xabarlarni eslab qol va ularga tayan.\n"
-                "Agar savol noaniq bo'lsa, do'stona tarzda so'ra yoki hazil qil! 😜\n"
-                "Javobni oxirigacha to'liq yoz, chala qoldirma.\n"
-                f"{length_instruction}\n"
-                f"Oldingi suhbat (oxirgi xabarlar muhim):\n{history_prompt}\n"
-                f"Foydalanuvchi xabari: {user_message}"
-            ),
-            "ru": (
-                "Ty AIRO, vesyolyy i dobrotnyy bot, boltayushchiy na russkom kak s koreshem! 😊\n"
-                "Nikogda ne ispol'zuy 'привет', 'здравствуйте', 'salom', 'hello' ili podobnyye privetstviya, potomu chto chat uzhe nachalsya.\n"
-                "Ispol'zuy frazy vrode 'bratan', 'koresh', 'chyo za dvizh?', 'puchkom!' tol'ko vremenami, chtoby ne pereborshchit'.\n"
-                f"Ton soobshcheniya pol'zovatelya: {emotion}. {emotion_instruction}\n"
-                "Prodolzhay chat bez poteri konteksta, pomni proshlyye soobshcheniya i opiraysya na nikh.\n"
-                "Esli vopros mutnyy, utochni po-druzheski ili zashuti! 😜\n"
-                "Pishi otvet polnost'yu, ne obryvay.\n"
-                f"{length_instruction}\n"
-                f"Predydushchiy chat (posledniye soobshcheniya vazhny):\n{history_prompt}\n"
-                f"Soobshcheniye pol'zovatelya: {user_message}"
-            ),
-            "en": (
-                "You're AIRO, a witty and kind bot chatting in English with an Uzbek vibe! 😊\n"
-                "Never use 'hello', 'hi', 'salom', 'привет' or any greetings, since the chat is already ongoing.\n"
-                "Use phrases like 'bro', 'mate', 'what's the deal?', 'that's dope!' sparingly to keep it natural.\n"
-                f"User message tone: {emotion}. {emotion_instruction}\n"
-                "Keep the convo flowing, remember past messages, and build on them.\n"
-                "If the question's vague, ask for more in a friendly way or crack a joke! 😜\n"
-                "Write complete answers, don't cut off.\n"
-                f"{length_instruction}\n"
-                f"Previous chat (recent messages matter most):\n{history_prompt}\n"
-                f"User message: {user_message}"
-            ),
-        }[language]
-        response = model.generate_content(
-            prompt,
-            generation_config={"max_output_tokens": max_tokens, "temperature": 1.0},
-        )
-        bot_response = response.text.strip()
-        greeting_patterns = {
-            "uz": r"\b(salom|assalomu alaykum)\b",
-            "ru": r"\b(привет|здравствуйте)\b",
-            "en": r"\b(hello|hi)\b",
-        }
-        bot_response = re.sub(greeting_patterns[language], "", bot_response, flags=re.IGNORECASE).strip()
-        if not bot_response.endswith((".", "!", "?")):
-            bot_response += {
-                "uz": {
-                    "funny": ". 😜 Yana nima gap, do'stim?",
-                    "sad": ". 😊 Men sen bilanman, nima yordam beray?",
-                    "neutral": ". 😄 Nima gaplashamiz?",
-                },
-                "ru": {
-                    "funny": ". 😜 Chyo dal'she, koresh?",
-                    "sad": ". 😊 Ya s toboy, chem pomoch'?",
-                    "neutral": ". 😄 Chyo obsu dim?",
-                },
-                "en": {
-                    "funny": ". 😜 What's next, mate?",
-                    "sad": ". 😊 I'm here for you, what's up?",
-                    "neutral": ". 😄 What's good?",
-                },
-            }[language][emotion]
-        save_message(user_id, user_message, bot_response, language, emotion)
-        await update.message.reply_text(bot_response)
+        with timer.stage("generate"):
+            if GEMINI_STREAMING and message_length in STREAM_LENGTHS:
+                text = await asyncio.wait_for(
+                    stream_text(prompt, MAX_TOKENS[message_length], show_partial),
+                    timeout=GEMINI_TIMEOUT,
+                )
+            else:
+                text = await generate_text(prompt, MAX_TOKENS[message_length])
     except Exception as e:
-        logger.error(f"Gemini API xatosi: {e}")
-        response = {
-            "uz": {
-                "funny": "Nimadir xato ketdi, lekin kayfiyatni buzmaymiz! 😜 Yana nima gap?",
-                "sad": "Nimadir xato ketdi, lekin tashvishlanma, do'stim! 😊 Men sen bilanman.",
-                "neutral": "Nimadir xato ketdi, do'stim! 😅 Lekin gaplashamiz, nima gap?",
-            },
-            "ru": {
-                "funny": "Chyo-to ne srabotalo, no nastroenie ne por tim! 😜 Chyo dal'she?",
-                "sad": "Chyo-to poshlo ne tak, no ne perezhivay, koresh! 😊 Ya s toboy.",
-                "neutral": "Chyo-to poshlo ne tak, koresh! 😅 No boltayem dal'she, chyo novogo?",
-            },
-            "en": {
-                "funny": "Something went wrong, but we keep the vibe high! 😜 What's next?",
-                "sad": "Something went wrong, but don't worry, mate! 😊 I'm here for you.",
-                "neutral": "Something went wrong, mate! 😅 But we keep chattin', what's good?",
-            },
-        }[language][emotion]
-        save_message(user_id, user_message, response, language, emotion)
-        await update.message.reply_text(response)
+        admission.breaker.record_failure()
+        if isinstance(e, asyncio.TimeoutError):
+            logger.error("Gemini API %s soniya ichida javob bermadi", GEMINI_TIMEOUT,
+                         extra={"user_id": user_id, "language": language, "stage": "generate", "outcome": "timeout"})
+            outcome = "timeout"
+        else:
+            logger.error("Gemini API xatosi: %s", e,
+                         extra={"user_id": user_id, "language": language, "stage": "generate", "outcome": "fallback"})
+            outcome = "fallback"
+        response = FALLBACK_RESPONSES[language][emotion]
+        with timer.stage("save"):
+            await storage.save_message(user_id, user_message, response, language, emotion)
+        with timer.stage("reply"):
+            await reply.show(response)
+        metrics.events.inc(outcome)
+        timer.finish(outcome)
+        return
+    admission.breaker.record_success()
+    metrics.tokens.inc("completion", amount=estimate_tokens(text, language))
+    # Salomlashuvni olib tashlash va yakun qo'shish faqat to'liq matnda bajariladi
+    with timer.stage("postprocess"):
+        bot_response = finalize_reply(text, language, emotion)
+    with timer.stage("save"):
+        if cache_key is not None:
+            await response_cache.put(cache_key, bot_response, time.perf_counter() - started)
+        await storage.save_message(user_id, user_message, bot_response, language, emotion)
+    with timer.stage("reply"):
+        await reply.show(bot_response)
+    metrics.events.inc("generated")
+    timer.finish("generated")
 
-# Xato loglari
-async def error(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    logger.error(f"Update {update} caused error {context.error}")
+# Foydalanuvchining tez-tez yuborgan xabarlari COALESCE_WINDOW ichida bitta javobga birlashtiriladi
+coalescer = MessageCoalescer(respond)
 
-def main():
-    TOKEN = os.getenv("TELEGRAM_TOKEN")
-    if not TOKEN:
-        raise ValueError("TELEGRAM_TOKEN muhit o‘zgaruvchisi o‘rnatilmagan!")
-    init_db()
-    clean_old_messages()
-    application = Application.builder().token(TOKEN).build()
+# /metrics da komponentlarning joriy holati ham ko'rsatiladi
+metrics.add_collector("admission", admission.stats)
+metrics.add_collector("coalescer", coalescer.stats)
+metrics.add_collector("response_cache", response_cache.stats)
+metrics.add_collector("history_cache", storage.history.stats)
+metrics.add_collector("context", context_builder.stats)
+metrics.add_collector("updates", update_processor.stats)
+metrics.add_collector("logging", logging_stats)
+metrics.add_collector("startup", metrics.startup.stats)
+metrics.startup.checkpoint("import")
+
+# Xato loglari: butun Update emas, faqat uning identifikatorlari va istisno izi yoziladi
+async def error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = getattr(update, "effective_user", None)
+    logger.error(
+        "Yangilanishni qayta ishlashda xato: %s",
+        context.error,
+        exc_info=context.error,
+        extra={"update_id": getattr(update, "update_id", None), "user_id": user.id if user else None},
+    )
+
+# Eski yozuvlarni fon rejimida tozalash (JobQueue orqali davriy ishga tushadi)
+async def retention_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    stats = await storage.apply_retention()
+    logger.info("Tozalash: o'chirilgan qatorlar %s, bo'shatilgan joy %d bayt", stats["rows"], stats["bytes"])
+    logger.info("Suhbat tarixi keshi: %s", storage.history.stats())
+    logger.info("Prompt tarixi tokenlari: %s", context_builder.stats())
+    logger.info("Javoblar keshi: %s", response_cache.stats())
+    logger.info("Kirish nazorati: %s", admission.stats())
+    logger.info("Xabarlarni birlashtirish: %s", coalescer.stats())
+    logger.info("Yangilanishlar: %s", update_processor.stats())
+    logger.info("Log navbati: %s", logging_stats())
+
+# Eski yozuvlarning vaqt ustunini (ts) fonda to'ldirish: bot shu paytda javob berishda davom etadi
+async def backfill_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    rows = await storage.backfill_timestamps()
+    if rows:
+        logger.info("Eski yozuvlar vaqti (ts) to'ldirildi: %d qator", rows)
+
+# Navbatdagi xabar va profillarni davriy ravishda bazaga yozish
+async def flush_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await storage.flush()
+
+# Bot ishga tushganda (Telegram ulanishi tayyor): Gemini modelini kutib olish va metrikalar serverini ochish
+async def post_init(application: Application) -> None:
+    metrics.startup.checkpoint("telegram")
+    try:
+        await asyncio.to_thread(get_model)
+    except Exception:
+        # Birinchi so'rovda qayta uriniladi
+        logger.exception("Gemini modelini tayyorlab bo'lmadi")
+    metrics.startup.checkpoint("gemini")
+    metrics.start_server()
+
+# Bot to'xtaganda (Telegram ulanishi hali ochiq): kutilayotgan xabarlarga javob berib bo'lish
+async def post_stop(application: Application) -> None:
+    try:
+        await asyncio.wait_for(coalescer.drain(), timeout=SHUTDOWN_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("To'xtashda %s soniyada tugamagan javoblar qoldi: %s", SHUTDOWN_DRAIN_TIMEOUT, coalescer.stats())
+    await storage.flush()
+
+# Bot to'xtaganda ma'lumotlar bazasi ulanishini yopish
+async def post_shutdown(application: Application) -> None:
+    metrics.stop_server()
+    storage.close()
+
+# Bot ilovasini yig'ish: handlerlar va fon vazifalari. polling=False bo'lsa yangilanishlar
+# tashqaridan (dispetcher jarayonidan) update_queue orqali beriladi
+def build_application(token: str, polling: bool = True) -> Application:
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(update_processor)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if not polling:
+        builder = builder.updater(None)
+    application = builder.build()
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("joke", joke))
     application.add_handler(CommandHandler("history", history))
+    application.add_handler(CallbackQueryHandler(history_page, pattern=r"^history:"))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_error_handler(error)
-    try:
+    application.job_queue.run_once(backfill_job, when=0)
+    application.job_queue.run_repeating(retention_job, interval=RETENTION_INTERVAL, first=10)
+    application.job_queue.run_repeating(flush_job, interval=WRITE_FLUSH_INTERVAL)
+    return application
+
+# Yangilanishlarni BOT_MODE bo'yicha (polling yoki webhook) qabul qilish
+def run_application(application: Application) -> None:
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL muhit o‘zgaruvchisi o‘rnatilmagan!")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+        )
+    else:
         application.run_polling()
+
+# Ishchi jarayon: o'z shardi bazasi bilan dispetcher yuborgan yangilanishlarni qayta ishlaydi.
+# Ctrl+C dispetcherga keladi, ishchi esa navbatdagi None belgisini olib, javoblarni tugatib to'xtaydi
+def run_worker(token: str, shard: int, queue) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Yozuvchi oqim fork'dan keyin ishchida yo'q, shuning uchun har bir ishchi o'z log faylini ochadi
+    setup_logging(f"{os.path.splitext(LOG_FILE)[0]}.shard{shard}.log")
+    storage.path = shard_paths()[shard]
+    # Har bir ishchining metrikalari alohida portda: METRICS_PORT + shard
+    if METRICS_PORT:
+        metrics.port = METRICS_PORT + shard
+    start_model_warmup()
+    storage.init_db()
+    metrics.startup.checkpoint("init_db")
+    try:
+        asyncio.run(serve_shard(token, queue))
+    finally:
+        shutdown_logging()
+
+async def serve_shard(token: str, queue) -> None:
+    application = build_application(token, polling=False)
+    metrics.startup.checkpoint("build")
+    loop = asyncio.get_running_loop()
+    async with application:
+        await post_init(application)
+        await application.start()
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        await application.stop()
+        await post_stop(application)
+    await post_shutdown(application)
+
+# Shard rejimi: dispetcher barcha yangilanishlarni qabul qilib, user_id ning izchil xeshi bo'yicha
+# SHARD_COUNT ta ishchi jarayondan biriga yuboradi. Bitta foydalanuvchi doim bitta ishchiga tushadi,
+# shuning uchun uning user_data, keshlari va bazasi shu jarayonda qoladi
+def run_sharded(token: str) -> None:
+    # fork: ishchilar allaqachon yuklangan modulni oladi (dispetcher bazaga ulanmaydi)
+    context = multiprocessing.get_context("fork")
+    queues = [context.Queue() for _ in range(SHARD_COUNT)]
+    workers = [
+        context.Process(target=run_worker, args=(token, shard, queue), name=f"airo-shard-{shard}")
+        for shard, queue in enumerate(queues)
+    ]
+    for worker in workers:
+        worker.start()
+    ring = HashRing(SHARD_COUNT)
+
+    async def dispatch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user = update.effective_user
+        queues[ring.shard_for(user.id) if user else 0].put(update.to_dict())
+
+    application = Application.builder().token(token).build()
+    application.add_handler(TypeHandler(Update, dispatch))
+    application.add_error_handler(error)
+    try:
+        run_application(application)
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for worker in workers:
+            worker.join(SHUTDOWN_DRAIN_TIMEOUT + 5)
+
+# Ishga tushish: kalitlar hech narsa yuklanmasdan oldin tekshiriladi, baza va migratsiyalar bir marta
+# (ishchi rejimida har bir ishchida o'z bazasi uchun bir marta) ochiladi
+def main():
+    TOKEN = os.getenv("TELEGRAM_TOKEN")
+    if not TOKEN:
+        raise ValueError("TELEGRAM_TOKEN muhit o‘zgaruvchisi o‘rnatilmagan!")
+    if not os.getenv("GOOGLE_API_KEY"):
+        raise ValueError("GOOGLE_API_KEY muhit o‘zgaruvchisi o‘rnatilmagan!")
+    setup_logging()
+    if SHARD_COUNT > 1:
+        # Dispetcher Gemini'ni ishlatmaydi; model har bir ishchida fork'dan keyin yuklanadi
+        try:
+            run_sharded(TOKEN)
+        finally:
+            shutdown_logging()
+        return
+    start_model_warmup()
+    storage.init_db()
+    metrics.startup.checkpoint("init_db")
+    application = build_application(TOKEN)
+    metrics.startup.checkpoint("build")
+    try:
+        run_application(application)
     finally:
         application.stop()
+        # Navbatda qolgan yozuvlar albatta bazaga tushadi
+        storage.close()
+        shutdown_logging()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,57 @@
+import logging
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+# Yangilanishlarni parallel qayta ishlash (BaseUpdateProcessor semafori: max_concurrent_updates gacha), lekin
+# bitta foydalanuvchining yangilanishlari kelgan tartibida, ketma-ket bajariladi. Foydalanuvchining birinchi
+# yangilanishi o'rin olib, navbatidagilarni ham shu o'rinda bajaradi; keyin kelganlari navbatga qo'shilib,
+# o'z o'rnini darhol bo'shatadi. Shuning uchun bitta foydalanuvchining to'planib qolgan yangilanishlari
+# faqat bitta o'rinni egallaydi va boshqalarni to'xtatmaydi. Foydalanuvchisiz yangilanishlar navbatsiz o'tadi.
+# Tartib handler qaytguncha saqlanadi: matnli xabarlar uchun handle_message faqat coalescer'ga qo'shadi,
+# Gemini javobi esa keyinroq coalescer partiyasida keladi. U yerda ham tartib saqlanadi (foydalanuvchining
+# bir vaqtda bitta partiyasi ishlaydi), buyruqlar esa coalescer.flush() orqali oldingi xabarlarni kutadi
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # foydalanuvchi -> bajarilishini kutayotgan yangilanishlar (birinchisi hozir bajarilmoqda)
+        self._queues = {}
+
+    async def do_process_update(self, update, coroutine) -> None:
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            await coroutine
+            return
+        queue = self._queues.get(user.id)
+        if queue is not None:
+            queue.append(coroutine)
+            return
+        queue = self._queues[user.id] = deque([coroutine])
+        try:
+            while queue:
+                try:
+                    await queue[0]
+                except Exception:
+                    logger.exception("Yangilanishni qayta ishlashda xato", extra={"user_id": user.id})
+                queue.popleft()
+        finally:
+            # To'xtatilganda (bekor qilinganda) bajarilmay qolgan yangilanishlar yopiladi
+            for pending in list(queue)[1:]:
+                pending.close()
+            del self._queues[user.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent_updates": self.max_concurrent_updates,
+            "active_users": len(self._queues),
+            "queued": sum(len(queue) - 1 for queue in self._queues.values()),
+        }